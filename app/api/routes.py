@@ -2,15 +2,24 @@
 app/api/routes.py
 API routes for the Combine Codes application.
 """
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
+import aiofiles.os
+import anyio
+import jinja2
 import stripe
+import hashlib
 import os
+import stat
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from functools import lru_cache
 import logging
+import asyncio
 from pydantic import BaseModel
+from cachetools import TTLCache
 
 from app.core.github_handler import GitHubHandler
 from app.core.file_concatenator import FileConcatenator
@@ -28,8 +37,11 @@ from app.models.schemas import (
     InvalidRepositoryError,
     FileSystemError,
     CacheError,
+    GitHubRepoInfo,
 )
 from app.config.pattern_manager import PatternManager
+from app.utils.session_store import SessionStore
+from app.utils.rate_limiter import TokenBucket, parse_retry_after
 from app.utils.payment_logger import (
     log_payment_attempt,
     log_payment_success,
@@ -43,26 +55,193 @@ from app.utils.payment_logger import (
 logger = logging.getLogger(__name__)
 client_logger = logging.getLogger("client")
 
-# Initialize router
-router = APIRouter()
+# Initialize router (JSON responses are serialized with orjson)
+router = APIRouter(default_response_class=ORJSONResponse)
 
-# Initialize templates
-templates = Jinja2Templates(directory="templates")
+# Initialize templates. Templates only change on deploy, so skip the
+# per-render mtime check and keep compiled bytecode across restarts.
+templates = Jinja2Templates(
+    env=jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"),
+        autoescape=True,
+        auto_reload=False,
+        bytecode_cache=jinja2.FileSystemBytecodeCache()
+    )
+)
+
+# Compile all templates up front so the first request doesn't pay for it
+for template_name in templates.env.list_templates():
+    templates.env.get_template(template_name)
+
+# Directory the combined output files are written to and served from
+OUTPUT_DIR = Path("output").resolve()
+
+# Chunk size used when streaming combined output (1 MiB)
+DOWNLOAD_CHUNK_SIZE = 1 << 20
 
-# Initialize Stripe with explicit reload from environment
-stripe_key = os.getenv("STRIPE_SECRET_KEY")
-if stripe_key:
-    stripe.api_key = stripe_key
-    logger.info(f"Stripe initialized with API key (masked): {stripe_key[:4]}...{stripe_key[-4:]}")
+# Stripe configuration, read once from the environment
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+
+# Initialize Stripe
+if STRIPE_SECRET_KEY:
+    stripe.api_key = STRIPE_SECRET_KEY
+    logger.info(f"Stripe initialized with API key (masked): {STRIPE_SECRET_KEY[:4]}...{STRIPE_SECRET_KEY[-4:]}")
 else:
     logger.error("Stripe API key not found in environment variables")
 
-# Initialize GitHub handler
-github_handler = GitHubHandler(
-    cache_dir=os.getenv("CACHE_DIR", "cache"),
-    github_token=os.getenv("GITHUB_TOKEN"),
-    cache_ttl=int(os.getenv("CACHE_TTL", "3600")),
-)
+@lru_cache(maxsize=1)
+def get_github_handler() -> GitHubHandler:
+    """Create the shared GitHub handler on first use (injected with Depends)."""
+    return GitHubHandler(
+        cache_dir=os.getenv("CACHE_DIR", "cache"),
+        github_token=os.getenv("GITHUB_TOKEN"),
+        cache_ttl=int(os.getenv("CACHE_TTL", "3600")),
+        max_concurrent_clones=int(os.getenv("MAX_CONCURRENT_CLONES", "4")),
+    )
+
+# Checkout line items, identical for every session (never mutated)
+CHECKOUT_LINE_ITEMS = [{
+    "price_data": {
+        "currency": "usd",
+        "product_data": {
+            "name": "Combine Codes Service",
+            "description": "Combine all files in a GitHub repository into a single file",
+        },
+        "unit_amount": 50,  # $0.50 in cents
+    },
+    "quantity": 1,
+}]
+
+# Bound the number of clone + combine jobs running at once
+MAX_CONCURRENT_CONCAT = int(os.getenv("MAX_CONCURRENT_CONCAT", "4"))
+concat_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CONCAT)
+
+# Pace Stripe API calls so bursts are smoothed out before Stripe returns 429.
+# GitHub is only reached through git clones, which the GitHub handler limits
+# by concurrency instead (MAX_CONCURRENT_CLONES).
+stripe_bucket = TokenBucket(rate=20, max_concurrency=16)
+
+async def _stripe_call(method, *args, **kwargs):
+    """Call a Stripe API method under the Stripe rate limiter."""
+    async with stripe_bucket:
+        try:
+            return await method(*args, **kwargs)
+        except stripe.error.RateLimitError as e:
+            # Back off for as long as Stripe asks before the next call
+            retry_after = parse_retry_after((e.headers or {}).get("Retry-After"))
+            if retry_after is not None:
+                stripe_bucket.pause(retry_after)
+            raise
+
+# Short-lived cache of checkout sessions that reached a terminal state.
+session_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# Open sessions are only kept for a few seconds so rapid client polls share
+# one Stripe call; the webhook marks them paid as soon as payment completes.
+open_session_cache = TTLCache(maxsize=10_000, ttl=3)
+
+async def _get_session_cached(session_id: str) -> stripe.checkout.Session:
+    """Retrieve a checkout session, reusing a recently retrieved one."""
+    session = session_cache.get(session_id) or open_session_cache.get(session_id)
+    if session is not None:
+        return session
+    
+    log_stripe_api_call("GET", "checkout.Session.retrieve", {"session_id": session_id})
+    session = await _stripe_call(stripe.checkout.Session.retrieve_async, session_id)
+    if session.payment_status == "paid" or session.status == "expired":
+        session_cache[session_id] = session
+    else:
+        open_session_cache[session_id] = session
+    if session.payment_status == "paid":
+        await paid_sessions.set(session_id, {"status": "paid"})
+    return session
+
+# Session stores are shared across workers through Redis when REDIS_URL is set
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Checkout session state pushed by Stripe webhooks, keyed by session id
+webhook_sessions = SessionStore("webhook_session", ttl=24 * 3600, redis_url=REDIS_URL)
+
+# Sessions already confirmed as paid. "paid" is terminal for a checkout
+# session, so repeat payment checks can skip Stripe entirely.
+paid_sessions = SessionStore("paid_session", ttl=3600, maxsize=100_000, redis_url=REDIS_URL)
+
+@lru_cache(maxsize=512)
+def _build_patterns(user_ignores: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Combine system and user ignore patterns, cached per unique set of user patterns."""
+    return tuple(PatternManager(user_ignores=list(user_ignores)).all_ignores)
+
+# Repository pre-check results, kept for 5 minutes and refreshed in the
+# background once older than PRECHECK_FRESH_SECONDS. Refreshes overwrite
+# entries, so other workers only keep a local copy for a few seconds.
+precheck_results = SessionStore("precheck", ttl=300, redis_url=REDIS_URL, local_ttl=5)
+PRECHECK_FRESH_SECONDS = 60
+_precheck_refreshing = set()
+_background_tasks = set()
+
+def _precheck_key(repo_url: str, github_token: Optional[str]) -> str:
+    """Build the pre-check cache key without storing the token itself."""
+    return hashlib.sha256(f"{repo_url}|{github_token or ''}".encode()).hexdigest()
+
+async def _refresh_pre_check(
+    github_handler: GitHubHandler,
+    key: str,
+    repo_url: str,
+    github_token: Optional[str],
+    parsed_repo: GitHubRepoInfo
+) -> GitHubRepoInfo:
+    """Scan a repository and store the result in the pre-check cache."""
+    repo_info = await github_handler.pre_check_repository(
+        repo_url,
+        github_token,
+        repo_info=parsed_repo
+    )
+    await precheck_results.set(key, {
+        "repo_info": repo_info.model_dump(mode="json"),
+        "checked_at": time.time()
+    })
+    return repo_info
+
+async def _background_refresh_pre_check(github_handler: GitHubHandler, key: str, *args) -> None:
+    """Refresh a stale pre-check entry, logging instead of raising on failure."""
+    try:
+        await _refresh_pre_check(github_handler, key, *args)
+    except Exception as e:
+        logger.warning(f"Background pre-check refresh failed: {str(e)}")
+    finally:
+        _precheck_refreshing.discard(key)
+
+async def _pre_check_cached(
+    github_handler: GitHubHandler,
+    repo_url: str,
+    github_token: Optional[str],
+    parsed_repo: GitHubRepoInfo
+) -> GitHubRepoInfo:
+    """
+    Pre-check a repository, serving recent results from the cache.
+
+    Stale entries are returned immediately while a background task refreshes them.
+    """
+    key = _precheck_key(repo_url, github_token)
+    cached = await precheck_results.get(key)
+    if cached is None:
+        return await _refresh_pre_check(github_handler, key, repo_url, github_token, parsed_repo)
+
+    if time.time() - cached["checked_at"] > PRECHECK_FRESH_SECONDS and key not in _precheck_refreshing:
+        _precheck_refreshing.add(key)
+        task = asyncio.create_task(
+            _background_refresh_pre_check(github_handler, key, repo_url, github_token, parsed_repo)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return GitHubRepoInfo.model_validate(cached["repo_info"])
+
+@lru_cache(maxsize=64)
+def _redirect_urls(base_url: str) -> Tuple[str, str]:
+    """Build the Stripe success and cancel redirect URLs for an application base URL."""
+    base = base_url.rstrip('/')
+    return base + "/success?session_id={CHECKOUT_SESSION_ID}", base + "/cancel"
 
 # Client log entry model
 class ClientLogEntry(BaseModel):
@@ -107,88 +286,106 @@ async def log_client_event(log_entry: ClientLogEntry, request: Request):
     # Format the log message
     log_message = f"[CLIENT] [{log_entry.name}] {log_entry.message}"
     
-    # Log with the appropriate level
+    # Log with the appropriate level (queued, written by a background thread)
     client_logger.log(level, log_message, extra={"client_data": log_data})
     
-    return {"status": "logged"}
+    return {"status": "queued"}
+
+@router.get("/healthz")
+async def healthz():
+    """Report liveness along with worker thread pool usage."""
+    limiter_stats = anyio.to_thread.current_default_thread_limiter().statistics()
+    return {
+        "status": "ok",
+        "threads": {
+            "total": limiter_stats.total_tokens,
+            "borrowed": limiter_stats.borrowed_tokens,
+            "waiting": limiter_stats.tasks_waiting
+        }
+    }
 
-@router.get("/")
+@router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Render the home page."""
     return templates.TemplateResponse(
         "index.html",
         {
             "request": request,
-            "stripe_publishable_key": os.getenv("STRIPE_PUBLISHABLE_KEY")
+            "stripe_publishable_key": STRIPE_PUBLISHABLE_KEY
         }
     )
 
+async def _discard_checkout_session(create_session: asyncio.Task) -> None:
+    """Expire a checkout session that was created for a failed pre-check.
+
+    The creation is awaited rather than cancelled: a request that already
+    reached Stripe would still create a session nobody could expire.
+    """
+    try:
+        checkout_session = await create_session
+    except (asyncio.CancelledError, stripe.error.StripeError):
+        return
+    try:
+        await _stripe_call(stripe.checkout.Session.expire_async, checkout_session.id)
+        logger.info(f"Expired unused Stripe checkout session: {checkout_session.id}")
+    except stripe.error.StripeError as e:
+        log_stripe_error(e)
+
 @router.post("/pre-check", response_model=RepositoryPreCheckResponse)
-async def pre_check_repository(request: RepositoryPreCheckRequest) -> RepositoryPreCheckResponse:
+async def pre_check_repository(
+    request: RepositoryPreCheckRequest,
+    github_handler: GitHubHandler = Depends(get_github_handler)
+) -> RepositoryPreCheckResponse:
     """
     Pre-check a GitHub repository before processing.
     Creates a Stripe checkout session for payment.
     """
     try:
-        # Validate repository URL and check accessibility
-        repo_info = await github_handler.pre_check_repository(str(request.repo_url), request.github_token)
+        # Validate repository URL up front so no checkout session is created for a bad URL
+        parsed_repo = github_handler.validate_github_url(str(request.repo_url))
 
         # Verify Stripe API key is set
-        if not stripe.api_key:
-            stripe_key = os.getenv("STRIPE_SECRET_KEY")
-            if stripe_key:
-                logger.warning("Stripe API key was not set. Resetting from environment.")
-                stripe.api_key = stripe_key
-            else:
-                logger.error("Stripe API key not found in environment variables")
-                raise ValueError("Stripe API key not configured")
+        if not STRIPE_SECRET_KEY:
+            logger.error("Stripe API key not found in environment variables")
+            raise ValueError("Stripe API key not configured")
 
         # Create Stripe checkout session
         logger.info(f"Creating Stripe checkout session for repository: {request.repo_url}")
-        success_url = str(request.base_url).rstrip('/') + "/success?session_id={CHECKOUT_SESSION_ID}"
-        cancel_url = str(request.base_url).rstrip('/') + "/cancel"
+        success_url, cancel_url = _redirect_urls(str(request.base_url))
         
         try:
             log_stripe_api_call("POST", "checkout.Session.create", {
                 "payment_method_types": ["card"],
-                "line_items": [{
-                    "price_data": {
-                        "currency": "usd",
-                        "product_data": {
-                            "name": "Combine Codes Service"
-                        },
-                        "unit_amount": 50
-                    },
-                    "quantity": 1
-                }],
+                "line_items": CHECKOUT_LINE_ITEMS,
                 "mode": "payment",
                 "success_url": success_url,
                 "cancel_url": cancel_url
             })
             
-            checkout_session = stripe.checkout.Session.create(
+            # Create the checkout session while the repository is scanned
+            create_session = asyncio.create_task(_stripe_call(
+                stripe.checkout.Session.create_async,
                 payment_method_types=["card"],
-                line_items=[{
-                    "price_data": {
-                        "currency": "usd",
-                        "product_data": {
-                            "name": "Combine Codes Service",
-                            "description": "Combine all files in a GitHub repository into a single file",
-                        },
-                        "unit_amount": 50,  # $0.50 in cents
-                    },
-                    "quantity": 1,
-                }],
+                line_items=CHECKOUT_LINE_ITEMS,
                 mode="payment",
                 success_url=success_url,
                 cancel_url=cancel_url,
                 metadata={
                     'repo_url': str(request.repo_url),
-                    'github_token': request.github_token or '',
-                    'repository_size_kb': str(repo_info.size_kb or ''),
-                    'estimated_file_count': str(repo_info.file_count or '')
+                    'github_token': request.github_token or ''
                 }
-            )
+            ))
+            try:
+                repo_info = await _pre_check_cached(
+                    github_handler,
+                    str(request.repo_url),
+                    request.github_token,
+                    parsed_repo
+                )
+            except BaseException:
+                await _discard_checkout_session(create_session)
+                raise
+            checkout_session = await create_session
             
             log_payment_attempt(
                 session_id=checkout_session.id,
@@ -203,9 +400,12 @@ async def pre_check_repository(request: RepositoryPreCheckRequest) -> Repository
             logger.info(f"Stripe checkout session created: {checkout_session.id}")
         except stripe.error.StripeError as e:
             log_stripe_error(e)
-            logger.error(f"Failed to create Stripe checkout session: {str(e)}")
-            logger.error(f"Stripe API Key configured: {'Yes' if stripe.api_key else 'No'}")
-            logger.error(f"Stripe API Key length: {len(stripe.api_key) if stripe.api_key else 0}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Stripe API Key configured: %s (length: %d)",
+                    "Yes" if stripe.api_key else "No",
+                    len(stripe.api_key) if stripe.api_key else 0
+                )
             raise
 
         return RepositoryPreCheckResponse(
@@ -221,9 +421,10 @@ async def pre_check_repository(request: RepositoryPreCheckRequest) -> Repository
 
     except (GitHubError, stripe.error.StripeError) as e:
         if isinstance(e, stripe.error.StripeError):
-            logger.error(f"Pre-check failed (Stripe Error): {str(e)}")
-            logger.error(f"Stripe API Key configured: {'Yes' if stripe.api_key else 'No'}")
-            logger.error(f"Stripe API Key length: {len(stripe.api_key) if stripe.api_key else 0}")
+            logger.error(
+                "Pre-check failed (Stripe Error): %s", e,
+                extra={"error_code": "STRIPE_ERROR", "repo_url": str(request.repo_url)}
+            )
             raise HTTPException(status_code=400, detail={"message": str(e), "error_code": "STRIPE_ERROR"})
         else:
             logger.error(f"Pre-check failed (GitHub Error): {str(e)}")
@@ -231,12 +432,11 @@ async def pre_check_repository(request: RepositoryPreCheckRequest) -> Repository
                 raise HTTPException(status_code=e.status_code, detail={"message": e.to_dict(), "error_code": "GITHUB_ERROR"})
             raise HTTPException(status_code=400, detail={"message": str(e), "error_code": "UNKNOWN_ERROR"})
 
-@router.get("/success")
+@router.get("/success", response_class=HTMLResponse)
 async def payment_success(request: Request, session_id: str):
     """Handle successful payment and show success page."""
     try:
-        log_stripe_api_call("GET", "checkout.Session.retrieve", {"session_id": session_id})
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = await _get_session_cached(session_id)
         
         # Log the successful payment
         payment_intent_id = session.payment_intent if hasattr(session, 'payment_intent') else None
@@ -260,7 +460,7 @@ async def payment_success(request: Request, session_id: str):
         logger.error(f"Error retrieving checkout session: {str(e)}")
         raise HTTPException(status_code=400, detail={"message": str(e), "error_code": "STRIPE_ERROR"})
 
-@router.get("/cancel")
+@router.get("/cancel", response_class=HTMLResponse)
 async def payment_canceled(request: Request):
     """Handle canceled payment."""
     # Get session ID from query params if available
@@ -272,83 +472,276 @@ async def payment_canceled(request: Request):
     logger.info(f"Payment canceled for session: {session_id}")
     return templates.TemplateResponse("cancel.html", {"request": request})
 
-@router.post("/concatenate", response_model=ConcatenateResponse)
-async def concatenate_repository(request: ConcatenateRequest) -> ConcatenateResponse:
-    """
-    Combine all files in a GitHub repository into a single file.
-    Requires a valid checkout session ID from a completed payment.
-    """
-    try:
-        # Verify payment status
-        session = stripe.checkout.Session.retrieve(request.checkout_session_id)
+async def _require_payment(checkout_session_id: str) -> None:
+    """Raise a 402 HTTPException unless the checkout session has been paid."""
+    if await paid_sessions.get(checkout_session_id) is None:
+        session = await _get_session_cached(checkout_session_id)
         if session.payment_status != "paid":
             raise HTTPException(
                 status_code=402,
                 detail="Payment required to process repository"
             )
 
-        # Clone repository and combine files
-        with github_handler as gh:
-            clone_result = await gh.clone_repository(
-                str(request.repo_url),
-                request.github_token
-            )
-            
-            # Use PatternManager to combine ignore patterns
-            pattern_manager = PatternManager(user_ignores=request.additional_ignores)
-            combined_ignores = pattern_manager.all_ignores
-            
-            # Log combined ignore patterns
-            logger.info(f"Combined ignore patterns: {combined_ignores}")
-            
-            concatenator = FileConcatenator(
-                repo_path=clone_result.repo_path,
-                additional_ignores=combined_ignores
-            )
-            
-            output_file = concatenator.concatenate()
-            
-            return ConcatenateResponse(
-                status="success",
-                message="Files combined successfully",
-                output_file=str(output_file),
-                statistics=concatenator.get_statistics()
-            )
+def _check_concat_capacity() -> None:
+    """Reject new jobs instead of queueing them when at capacity."""
+    if concat_semaphore.locked():
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing other repositories, please retry shortly"
+        )
 
-    except (GitHubError, FileSystemError, CacheError) as e:
+async def _acquire_concat_slot() -> None:
+    """Take a job slot, rejecting the request instead of queueing it when at capacity."""
+    _check_concat_capacity()
+    await concat_semaphore.acquire()
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that releases a concat_semaphore slot once it is done.
+
+    The slot is released when the response has been sent or has failed,
+    including when the client disconnects before the body iterator starts.
+    A generator's own finally block would never run in that case.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._released = False
+
+    def release(self) -> None:
+        """Release the slot, at most once."""
+        if not self._released:
+            self._released = True
+            concat_semaphore.release()
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+async def _prepare_concatenator(request: ConcatenateRequest, github_handler: GitHubHandler) -> FileConcatenator:
+    """Clone the requested repository and set up a FileConcatenator for it."""
+    # History is never needed for concatenation, so skip it
+    clone_result = await github_handler.clone_repository(
+        str(request.repo_url),
+        request.github_token,
+        shallow=True,
+        blob_filter="blob:none"
+    )
+    
+    # Use PatternManager to combine ignore patterns
+    combined_ignores = list(_build_patterns(tuple(sorted(request.additional_ignores or []))))
+    
+    # Log combined ignore patterns
+    logger.info(f"Combined ignore patterns: {combined_ignores}")
+    
+    # Setup checks the repo path and reads .gitignore, so keep it off the event loop
+    return await asyncio.to_thread(
+        FileConcatenator,
+        repo_path=clone_result.repo_path,
+        additional_ignores=combined_ignores
+    )
+
+async def _prepare_paid_concatenator(request: ConcatenateRequest, github_handler: GitHubHandler) -> FileConcatenator:
+    """
+    Verify payment, then take a job slot and set up the concatenator.
+
+    On success the caller holds a concat_semaphore slot and must release it.
+    Setup only overlaps the payment check when that cannot be abused: the
+    session is already known to be paid, or the repository is in the clone
+    cache. Otherwise nothing is cloned and no slot is taken before payment
+    is confirmed.
+    """
+    speculate = (
+        await paid_sessions.get(request.checkout_session_id) is not None
+        or github_handler.is_cached(str(request.repo_url), request.github_token)
+    )
+    prepare = asyncio.create_task(_prepare_concatenator(request, github_handler)) if speculate else None
+    try:
+        await _require_payment(request.checkout_session_id)
+        await _acquire_concat_slot()
+    except BaseException:
+        if prepare is not None:
+            prepare.cancel()
+            await asyncio.gather(prepare, return_exceptions=True)
+        raise
+    
+    try:
+        if prepare is None:
+            return await _prepare_concatenator(request, github_handler)
+        return await prepare
+    except BaseException:
+        concat_semaphore.release()
+        raise
+
+def _concatenate_error(e: Exception) -> HTTPException:
+    """Map an error raised while combining a repository to an HTTPException."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, (GitHubError, FileSystemError, CacheError)):
         logger.error(f"Combining failed: {str(e)}")
-        raise HTTPException(status_code=e.status_code, detail=e.to_dict())
-    except stripe.error.StripeError as e:
+        return HTTPException(status_code=e.status_code, detail=e.to_dict())
+    if isinstance(e, stripe.error.StripeError):
         logger.error(f"Payment verification failed: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+        return HTTPException(status_code=400, detail=str(e))
+    logger.error(f"Unexpected error: {str(e)}")
+    return HTTPException(status_code=500, detail=str(e))
+
+@router.post("/concatenate", response_model=ConcatenateResponse)
+async def concatenate_repository(
+    request: ConcatenateRequest,
+    github_handler: GitHubHandler = Depends(get_github_handler)
+) -> ORJSONResponse:
+    """
+    Combine all files in a GitHub repository into a single file.
+    Requires a valid checkout session ID from a completed payment.
+    """
+    try:
+        _check_concat_capacity()
+        # Verify payment and clone, then combine files in the job slot taken for it
+        concatenator = await _prepare_paid_concatenator(request, github_handler)
+        try:
+            output_file = await concatenator.concatenate_async()
+            
+            # The statistics (including the directory tree) are already plain
+            # data, so serialize them directly instead of re-validating and
+            # re-encoding them through the response model
+            return ORJSONResponse({
+                "status": "success",
+                "message": "Files combined successfully",
+                "output_file": str(output_file),
+                "statistics": concatenator.get_statistics()
+            })
+        finally:
+            concat_semaphore.release()
+
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _concatenate_error(e)
+
+@router.post("/concatenate/stream")
+async def concatenate_repository_stream(
+    request: ConcatenateRequest,
+    github_handler: GitHubHandler = Depends(get_github_handler)
+) -> StreamingResponse:
+    """
+    Combine all files in a GitHub repository, streaming the combined output
+    as it is produced instead of writing it to the output directory.
+    Requires a valid checkout session ID from a completed payment.
+    """
+    try:
+        # The slot taken after payment is held until the stream finishes
+        _check_concat_capacity()
+        concatenator = await _prepare_paid_concatenator(request, github_handler)
+
+    except Exception as e:
+        raise _concatenate_error(e)
+
+    return SlotStreamingResponse(
+        concatenator.iter_concatenated_chunks(DOWNLOAD_CHUNK_SIZE),
+        media_type="text/plain"
+    )
 
 @router.get("/download/{filename:path}")
 async def download_file(filename: str):
     """Download the concatenated file."""
     try:
-        file_path = Path("output") / filename
-        if not file_path.is_file():
+        # Normalize lexically so the path check needs no filesystem calls
+        file_path = Path(os.path.normpath(OUTPUT_DIR / filename))
+        if not file_path.is_relative_to(OUTPUT_DIR):
+            raise HTTPException(status_code=400, detail="Invalid file path")
+        try:
+            file_stat = await aiofiles.os.stat(file_path)
+        except OSError:
+            file_stat = None
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
             raise HTTPException(status_code=404, detail="File not found")
         
+        # FileResponse reuses the stat result and serves Range requests
         return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="text/plain"
+            file_path,
+            filename=file_path.name,
+            media_type="text/plain",
+            stat_result=file_stat
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Download failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/stripe/webhook")
+async def stripe_webhook(request: Request):
+    """
+    Receive Stripe webhook events.
+    
+    Verifies the event signature and records the final state of checkout
+    sessions so that payment verification does not need to poll Stripe.
+    """
+    webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+    if not webhook_secret:
+        logger.error("Stripe webhook secret not found in environment variables")
+        raise HTTPException(status_code=500, detail={"message": "Webhook not configured", "error_code": "STRIPE_ERROR"})
+    
+    payload = await request.body()
+    sig_header = request.headers.get("stripe-signature")
+    
+    try:
+        event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
+    except ValueError as e:
+        logger.error(f"Invalid Stripe webhook payload: {str(e)}")
+        raise HTTPException(status_code=400, detail={"message": "Invalid payload", "error_code": "STRIPE_ERROR"})
+    except stripe.error.SignatureVerificationError as e:
+        log_stripe_error(e)
+        raise HTTPException(status_code=400, detail={"message": "Invalid signature", "error_code": "STRIPE_ERROR"})
+    
+    session = event["data"]["object"]
+    open_session_cache.pop(session["id"], None)
+    if event["type"] in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
+        if session.get("payment_status") == "paid":
+            await paid_sessions.set(session["id"], {"status": "paid"})
+            await webhook_sessions.set(session["id"], {
+                "status": "paid",
+                "repo_url": (session.get("metadata") or {}).get("repo_url")
+            })
+            log_payment_success(session["id"], session.get("payment_intent"))
+    elif event["type"] in ("checkout.session.expired", "checkout.session.async_payment_failed"):
+        await webhook_sessions.set(session["id"], {
+            "status": "failed",
+            "repo_url": (session.get("metadata") or {}).get("repo_url")
+        })
+        log_payment_failure(session["id"], f"Checkout session event: {event['type']}", session.get("status"))
+    
+    return {"status": "received"}
+
 @router.post("/verify-payment", response_model=PaymentVerificationResponse)
 async def verify_payment(request: PaymentVerificationRequest) -> PaymentVerificationResponse:
     """Verify the payment status of a checkout session."""
+    # Repeat polls for an already paid session don't need Stripe
+    if await paid_sessions.get(request.checkout_session_id) is not None:
+        return PaymentVerificationResponse(
+            status=PaymentStatus.COMPLETED,
+            message="Payment completed successfully",
+            checkout_session_id=request.checkout_session_id
+        )
+    
+    # Use state delivered by webhook when available
+    webhook_state = await webhook_sessions.get(request.checkout_session_id)
+    if webhook_state is not None:
+        if webhook_state["status"] == "paid":
+            return PaymentVerificationResponse(
+                status=PaymentStatus.COMPLETED,
+                message="Payment completed successfully",
+                checkout_session_id=request.checkout_session_id
+            )
+        return PaymentVerificationResponse(
+            status=PaymentStatus.FAILED,
+            message="Payment failed or expired",
+            checkout_session_id=request.checkout_session_id
+        )
+    
     try:
-        log_stripe_api_call("GET", "checkout.Session.retrieve", {"session_id": request.checkout_session_id})
-        session = stripe.checkout.Session.retrieve(request.checkout_session_id)
+        session = await _get_session_cached(request.checkout_session_id)
         
         if session.payment_status == "paid":
             payment_intent_id = session.payment_intent if hasattr(session, 'payment_intent') else None
@@ -6,7 +6,10 @@ set of patterns for consistent application across different components.
 """
 
 import pathlib
-from typing import List, Union
+import re
+from functools import lru_cache
+from itertools import chain
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Pattern, Tuple, Union
 from pathspec import PathSpec
 from pathspec.patterns import GitWildMatchPattern
 import logging
@@ -22,10 +25,125 @@ SYSTEM_IGNORES = [
     "*.zip", "*.tar.gz", "*.rar", "*.mp4", "*.mp3", "*.avi", "*.mov", "*.iso"
 ]
 
+# Frozen copy of the system patterns used when combining
+_SYSTEM_IGNORES_TUPLE = tuple(dict.fromkeys(SYSTEM_IGNORES))
+
 def get_system_ignores() -> List[str]:
     """Get the list of system-wide ignore patterns."""
     return SYSTEM_IGNORES.copy()
 
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str) -> PathSpec:
+    """Compile a single ignore pattern, cached so each pattern is compiled once."""
+    return PathSpec.from_lines(GitWildMatchPattern, [pattern])
+
+@lru_cache(maxsize=32)
+def compile_patterns(patterns: Tuple[str, ...]) -> PathSpec:
+    """Compile ignore patterns into a PathSpec, cached per unique pattern tuple."""
+    # Assemble from the per-pattern cache so shared (e.g. system) patterns are parsed once
+    return PathSpec(list(chain.from_iterable(compile_pattern(p).patterns for p in patterns)))
+
+@lru_cache(maxsize=32)
+def compile_union_regex(patterns: Tuple[str, ...]) -> Tuple[Optional[Pattern], bool]:
+    """
+    Combine the ignoring (non-negated) patterns into a single alternation regex.
+
+    Returns the regex (None if there are no ignoring patterns) and whether any
+    negation ("!pattern") was seen. Negations depend on evaluation order, so
+    with them the regex only rules paths out and the PathSpec decides the rest.
+    """
+    fragments = []
+    has_negations = False
+    for pattern in patterns:
+        regex, include = GitWildMatchPattern.pattern_to_regex(pattern)
+        if include is None:
+            continue
+        if not include:
+            has_negations = True
+            continue
+        # Drop the named group so fragments can be joined without clashes
+        fragments.append(regex.replace("(?P<ps_d>", "(?:"))
+    if not fragments:
+        return None, has_negations
+    return re.compile("|".join(f"(?:{fragment})" for fragment in fragments)), has_negations
+
+# Characters that give a pattern glob or escape semantics
+_GLOB_CHARS = frozenset("*?[\\")
+
+class LiteralPatterns(NamedTuple):
+    """
+    Ignoring patterns that can be matched on path components without a regex.
+
+    "name" matches any component, "name/" any directory component, "*.ext" any
+    component ending in ".ext" and "*.ext/" any directory component ending in it.
+    """
+    names: FrozenSet[str]
+    dir_names: FrozenSet[str]
+    suffixes: Tuple[str, ...]
+    dir_suffixes: Tuple[str, ...]
+
+    def match(self, path: str) -> bool:
+        """Check if any of the patterns matches a relative path ("dir/" for directories)."""
+        dirs = path.split("/")
+        last = dirs.pop()
+        if last and (last in self.names or last.endswith(self.suffixes)):
+            return True
+        for part in dirs:
+            if (part in self.names or part in self.dir_names
+                    or part.endswith(self.suffixes) or part.endswith(self.dir_suffixes)):
+                return True
+        return False
+
+@lru_cache(maxsize=32)
+def split_literal_patterns(patterns: Tuple[str, ...]) -> Tuple[LiteralPatterns, Tuple[str, ...]]:
+    """
+    Split out the ignoring patterns that LiteralPatterns can match.
+
+    Returns the literal patterns and the remaining patterns (including all
+    negations), which still need the regex and PathSpec matchers.
+    """
+    names, dir_names, suffixes, dir_suffixes, rest = set(), set(), [], [], []
+    for pattern in patterns:
+        dir_only = pattern.endswith("/")
+        core = pattern[:-1] if dir_only else pattern
+        # Anchored, negated, special or escaped patterns keep full gitignore semantics
+        if not core or "/" in core or core[0] == "!" or core in (".", ".."):
+            rest.append(pattern)
+        elif _GLOB_CHARS.isdisjoint(core):
+            (dir_names if dir_only else names).add(core)
+        elif core[0] == "*" and len(core) > 1 and _GLOB_CHARS.isdisjoint(core[1:]):
+            (dir_suffixes if dir_only else suffixes).append(core[1:])
+        else:
+            rest.append(pattern)
+    literals = LiteralPatterns(frozenset(names), frozenset(dir_names), tuple(suffixes), tuple(dir_suffixes))
+    return literals, tuple(rest)
+
+def _normalized(patterns: Iterable[str]) -> Iterable[str]:
+    """Strip patterns once each, dropping empty lines and comments."""
+    return (p for p in map(str.strip, patterns) if p and not p.startswith("#"))
+
+@lru_cache(maxsize=128)
+def _read_gitignore(path: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """Read and normalize a .gitignore file; cached per path and version (mtime, size)."""
+    if not size:
+        return ()
+    with open(path, "rb") as f:
+        raw = f.read().decode("utf-8", "ignore")
+    return tuple(_normalized(raw.splitlines()))
+
+@lru_cache(maxsize=256)
+def combine_patterns(repo_ignores: Tuple[str, ...], user_ignores: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Combine system, repository, and user patterns, in that order.
+
+    Order matters for negations ("!pattern"): as in .gitignore, the last
+    matching pattern wins, so a duplicate keeps its last position.
+    """
+    if not repo_ignores and not user_ignores:
+        return _SYSTEM_IGNORES_TUPLE
+    combined = chain(_SYSTEM_IGNORES_TUPLE, repo_ignores, user_ignores)
+    return tuple(reversed(dict.fromkeys(reversed(list(combined)))))
+
 class PatternManager:
     """
     Manages ignore patterns.
@@ -34,32 +152,51 @@ class PatternManager:
         """
         Initialize the PatternManager.
         """
-        self.system_ignores = get_system_ignores()
+        self.system_ignores = _SYSTEM_IGNORES_TUPLE
         self.repo_ignores = self._normalize_patterns(repo_ignores)
         self.user_ignores = self._normalize_patterns(user_ignores)
 
-        self.all_ignores = self._combine_patterns()
-        self.spec = PathSpec.from_lines(GitWildMatchPattern, self.all_ignores)
+        self._compile()
 
     def _normalize_patterns(self, patterns: List[str]) -> List[str]:
         """Normalize patterns."""
         if not patterns:
             return []
-        return [
-            p.strip() for p in patterns
-            if p.strip() and not p.strip().startswith("#")
-        ]
+        return list(_normalized(patterns))
 
     def _combine_patterns(self) -> List[str]:
-        """Combine system, repository, and user patterns."""
-        combined = set(self.system_ignores)
-        combined.update(self.repo_ignores)
-        combined.update(self.user_ignores)
-        return sorted(combined)
+        """Combine system, repository, and user patterns (cached per unique combination)."""
+        return list(combine_patterns(tuple(self.repo_ignores), tuple(self.user_ignores)))
+
+    def _compile(self):
+        """Combine all patterns and compile the matchers for them."""
+        self.all_ignores = self._combine_patterns()
+        patterns = tuple(self.all_ignores)
+        self.spec = compile_patterns(patterns)
+        # Plain names and extensions are matched by set lookups, the rest by one regex
+        self._literals, remaining = split_literal_patterns(patterns)
+        self._union_regex, self._has_negations = compile_union_regex(remaining)
 
     def should_ignore(self, file_path: Union[str, pathlib.Path]) -> bool:
         """Check if a file should be ignored."""
-        return self.spec.match_file(str(file_path))
+        path = str(file_path)
+        # Negations can only un-ignore, so no match here means not ignored
+        if not self._matches_any(path):
+            return False
+        return not self._has_negations or self.spec.match_file(path)
+
+    def _matches_any(self, path: str) -> bool:
+        """Check if any ignoring (non-negated) pattern matches a path."""
+        if self._literals.match(path):
+            return True
+        return self._union_regex is not None and self._union_regex.match(path) is not None
+
+    def match_files(self, file_paths: Iterable[Union[str, pathlib.Path]]) -> List[str]:
+        """Return the paths (as strings) that should be ignored, in a single pass."""
+        candidates = [p for p in map(str, file_paths) if self._matches_any(p)]
+        if not self._has_negations:
+            return candidates
+        return list(self.spec.match_files(candidates))
 
     @classmethod
     def from_repo_path(cls, repo_path: Union[str, pathlib.Path], user_ignores: List[str] = None) -> "PatternManager":
@@ -70,21 +207,22 @@ class PatternManager:
         gitignore_path = repo_path / ".gitignore"
         repo_ignores = []
 
-        if gitignore_path.exists():
-            try:
-                with open(gitignore_path, "r") as f:
-                    repo_ignores = [line.strip() for line in f]
-            except OSError:
-                pass
+        try:
+            # Unchanged .gitignore files are only read and parsed once
+            gitignore_stat = gitignore_path.stat()
+            repo_ignores = list(_read_gitignore(
+                str(gitignore_path), gitignore_stat.st_mtime_ns, gitignore_stat.st_size
+            ))
+        except OSError:
+            pass
 
         # *** CORRECTLY INITIALIZE WITH ALL IGNORE TYPES ***
         return cls(repo_ignores=repo_ignores, user_ignores=user_ignores) # THIS LINE IS CRUCIAL
 
 
     def _recalculate_patterns(self):
-        """Recalculate all_ignores and update the PathSpec."""
-        self.all_ignores = self._combine_patterns()
-        self.spec = PathSpec.from_lines(GitWildMatchPattern, self.all_ignores)
+        """Recalculate all_ignores and update the compiled matchers."""
+        self._compile()
 
     def add_user_ignores(self, user_ignores: List[str]):
         """Adds user ignores and updates the combined patterns."""
@@ -7,15 +7,23 @@ It includes methods for walking directories, filtering files, and updating
 statistics related to the combining process.
 """
 import pathlib
-from pathspec import PathSpec
-from pathspec.patterns import GitWildMatchPattern
 import logging
 import aiofiles
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Tuple, AsyncIterator, Union
 from datetime import datetime
 import uuid
 import os
 import re
+import asyncio
+import codecs
+import errno
+import mmap
+import multiprocessing
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from operator import methodcaller
 
 from app.models.schemas import (
     CombiningStats,
@@ -26,7 +34,83 @@ from app.config.pattern_manager import PatternManager
 
 logger = logging.getLogger(__name__)
 
+# Characters that are not safe in output file names
+_SAFE_NAME_RE = re.compile(r'[^\w\-]')
+
+# os.sendfile() errors meaning it can't copy between these files, not that the copy failed
+_NO_SENDFILE_ERRNOS = frozenset({errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP})
+
+# Worker processes shared by all concatenations, started on first use
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _init_worker() -> None:
+    """Set up a worker process of the shared process pool."""
+    # Ctrl+C goes to the whole process group; the server shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _process_pool = ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+    return _process_pool
+
+async def _analyze_in_worker(data: bytes) -> Tuple[int, int, int]:
+    """Run _analyze_content() in the shared process pool, replacing the pool if it has broken."""
+    pool = _get_process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, _analyze_content, data)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for using too much memory); later files get a new pool
+        global _process_pool
+        if _process_pool is pool:
+            _process_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        logger.warning("File analysis process pool broke, analyzing in a thread instead")
+        return await asyncio.to_thread(_analyze_content, data)
+
+class BinaryFileError(Exception):
+    """Raised when a file is recognized as binary before it is decoded."""
+
+class _LargeFile(NamedTuple):
+    """A file too large to hold in memory, copied into the output when its turn comes."""
+    path: pathlib.Path
+    size: int
+
+def _analyze_content(data: bytes) -> Tuple[int, int, int]:
+    """Validate file content as UTF-8 and count its total, empty and comment lines."""
+    return FileConcatenator._count_lines(data.decode('utf-8').splitlines())
+
 class FileConcatenator:
+    # Maximum number of files read ahead while combining
+    READ_CONCURRENCY = 64
+    # Maximum bytes of file content read ahead while combining (32 MiB)
+    READ_AHEAD_BYTES = 1 << 25
+    # Files larger than this are streamed in chunks instead of read whole (4 MiB)
+    STREAM_THRESHOLD = 1 << 22
+    # Buffer size for the combined output file (1 MiB)
+    WRITE_BUFFER_SIZE = 1 << 20
+    # Read size used when streaming a large file into the output (256 KiB)
+    COPY_CHUNK_SIZE = 1 << 18
+    # Markers a line starts with (after whitespace) to count as a comment
+    COMMENT_MARKERS = ('#', '//', '/*', '*', '<!--', '-->', '"""', "'''")
+    # Extensions of files that are skipped as binary without being read
+    BINARY_EXTENSIONS = frozenset({
+        '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp', '.tif', '.tiff', '.psd',
+        '.pdf', '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar', '.jar', '.war',
+        '.exe', '.dll', '.so', '.dylib', '.o', '.a', '.lib', '.bin', '.class', '.pyc', '.pyo', '.wasm',
+        '.mp3', '.mp4', '.wav', '.ogg', '.flac', '.avi', '.mov', '.mkv', '.webm',
+        '.ttf', '.otf', '.woff', '.woff2', '.eot', '.sqlite', '.db', '.iso',
+    })
+    # Leading bytes searched for a NUL byte, which marks a file as binary
+    BINARY_SNIFF_SIZE = 4096
+    # Files at least this large are analyzed in a worker process (256 KiB)
+    PROCESS_THRESHOLD = 1 << 18
+
     def __init__(self, repo_path: pathlib.Path, additional_ignores: List[str] = None):
         """
         Initialize the FileConcatenator with a repository path and optional ignore patterns.
@@ -38,6 +122,8 @@ class FileConcatenator:
         try:
             logger.info(f"Initializing concatenator for repository: {repo_path}")
             self.base_dir = pathlib.Path(repo_path).resolve()
+            # Prefix of every walked path, with its trailing separator
+            self._base_prefix = os.path.join(str(self.base_dir), '')
             if not self.base_dir.exists():
                 raise FileConcatenatorError(f"Directory does not exist: {repo_path}")
             
@@ -57,6 +143,12 @@ class FileConcatenator:
             if additional_ignores:
                 self.pattern_manager.add_user_ignores(additional_ignores)
             
+            # Ignore decisions by relative path, shared by the walk and tree passes
+            self._ignore_cache: Dict[str, bool] = {}
+            # Lowercased extension (with its dot, '' if none) and size of each walked file
+            self._extensions: Dict[pathlib.Path, str] = {}
+            self._sizes: Dict[pathlib.Path, int] = {}
+            
             # Initialize statistics
             self.stats = CombiningStats()
             
@@ -79,12 +171,39 @@ class FileConcatenator:
         Returns:
             List[str]: Normalized list of patterns.
         """
-        return [pattern.strip() for pattern in patterns if pattern.strip() and not pattern.strip().startswith('#')]
+        stripped = map(str.strip, patterns)
+        return [pattern for pattern in stripped if pattern and not pattern.startswith('#')]
 
     def concatenate(self) -> str:
         """
         Combine all files in the repository.
         
+        Runs concatenate_async() to completion on its own event loop, so both
+        entry points share one output pipeline. Called from a thread that is
+        already running an event loop, the work runs in a separate thread
+        (still blocking the caller); use concatenate_async() from async code.
+        
+        Returns:
+            str: The path to the combined file.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.concatenate_async())
+        
+        # asyncio.run() cannot be nested in a running event loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.concatenate_async()).result()
+
+    async def concatenate_async(self) -> str:
+        """
+        Combine all files in the repository, reading files concurrently.
+        
+        Up to READ_CONCURRENCY files (and READ_AHEAD_BYTES of content) are
+        read ahead in worker threads while the output is written in walk
+        order. Files above STREAM_THRESHOLD are copied into the output by
+        _copy_file().
+        
         Returns:
             str: The path to the combined file.
         """
@@ -93,170 +212,343 @@ class FileConcatenator:
             output_filename = self._generate_unique_filename(repo_name)
             output_file = self.output_dir / output_filename
             
-            # Get all files to process
-            files = self._walk_directory()
-            self.stats.file_stats.total_files = len(files)
+            async with aiofiles.open(output_file, 'wb') as outfile:
+                async for part in self._iter_coalesced(self.WRITE_BUFFER_SIZE):
+                    if isinstance(part, _LargeFile):
+                        # Large files go from disk to disk without passing through Python
+                        await outfile.flush()
+                        await asyncio.to_thread(self._copy_file, part.path, part.size, outfile.fileno())
+                    else:
+                        await outfile.write(part)
+            
+            return output_filename
+            
+        except Exception as e:
+            logger.error(f"Combining failed: {str(e)}")
+            raise FileConcatenatorError(f"Combining error: {str(e)}")
+
+    async def iter_concatenated_chunks(self, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+        """
+        Produce the combined output as a stream of byte chunks.
+        
+        Small pieces are coalesced into chunks of about chunk_size bytes;
+        statistics are complete once the iterator is exhausted.
+        
+        Args:
+            chunk_size (int): Target chunk size in bytes.
             
-            # Build directory tree
-            self.stats.dir_stats.tree = self._build_directory_tree()
+        Yields:
+            bytes: The next part of the combined output.
+        """
+        async for part in self._iter_coalesced(chunk_size):
+            if isinstance(part, _LargeFile):
+                async for chunk in self._iter_file_chunks(part.path, part.size):
+                    yield chunk
+            else:
+                yield part
+
+    async def _iter_coalesced(self, chunk_size: int) -> AsyncIterator[Union[bytes, _LargeFile]]:
+        """Coalesce the parts of _iter_output() into chunks of about chunk_size bytes."""
+        buffer = bytearray()
+        async for part in self._iter_output():
+            if isinstance(part, _LargeFile) or len(part) >= chunk_size:
+                # Pass large file contents through without copying them
+                if buffer:
+                    yield bytes(buffer)
+                    buffer.clear()
+                yield part
+                continue
+            
+            buffer += part
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        
+        if buffer:
+            yield bytes(buffer)
+
+    async def _iter_output(self) -> AsyncIterator[Union[bytes, _LargeFile]]:
+        """Yield the headers and file contents of the combined output in order."""
+        # Get all files to process and build the directory tree off the event loop
+        files, self.stats.dir_stats.tree = await asyncio.to_thread(self._walk_and_build)
+        file_stats = self.stats.file_stats
+        file_stats.total_files = len(files)
+        
+        async def read_file(file_path: pathlib.Path) -> Tuple[Optional[bytes], int, Tuple[int, int, int]]:
+            # Known binaries are skipped without being read, others by their first bytes
+            self._check_binary_name(file_path)
+            data, file_size, line_counts = await asyncio.to_thread(self._read_file, file_path)
+            if line_counts is None:
+                # Large files are decoded and counted on another core
+                line_counts = await _analyze_in_worker(data)
+            return data, file_size, line_counts
+        
+        # Keep a window of reads in flight, consumed in order and bounded both by
+        # file count and by the bytes held in memory
+        remaining = iter(files)
+        next_path = next(remaining, None)
+        pending = deque()
+        held_bytes = 0
+        
+        def read_ahead():
+            nonlocal next_path, held_bytes
+            while next_path is not None and len(pending) < self.READ_CONCURRENCY:
+                # Streamed files are not held in memory; one read is always allowed
+                size = self._sizes.get(next_path, 0)
+                if size > self.STREAM_THRESHOLD:
+                    size = 0
+                if pending and held_bytes + size > self.READ_AHEAD_BYTES:
+                    break
+                held_bytes += size
+                pending.append((next_path, size, asyncio.create_task(read_file(next_path))))
+                next_path = next(remaining, None)
+        
+        read_ahead()
+        try:
+            # Write header
+            yield self._repo_header().encode('utf-8')
             
             # Process each file
-            with open(output_file, 'w', encoding='utf-8') as outfile:
-                # Write header
-                outfile.write(f"Repository: {self.base_dir}\n")
-                outfile.write("=" * (len(str(self.base_dir)) + 12) + "\n\n")
+            while pending:
+                file_path, size, read_task = pending.popleft()
+                held_bytes -= size
+                read_ahead()
+                
+                try:
+                    data, file_size, line_counts = await read_task
+                    
+                    # Update statistics
+                    self._update_file_stats(file_path, file_size, line_counts)
+                    file_stats.processed_files += 1
+                    
+                except (BinaryFileError, UnicodeDecodeError):
+                    logger.warning(f"Skipping binary file: {file_path}")
+                    file_stats.skipped_files += 1
+                    continue
+                except Exception as e:
+                    logger.error(f"Error processing file {file_path}: {e}")
+                    file_stats.skipped_files += 1
+                    continue
+                
+                # Write file header and content
+                yield self._file_header(file_path)
+                yield _LargeFile(file_path, file_size) if data is None else data
+                yield b"\n"
+        finally:
+            for _, _, read_task in pending:
+                read_task.cancel()
+
+    def _repo_header(self) -> str:
+        """Build the header written at the top of the combined file."""
+        return f"Repository: {self.base_dir}\n" + "=" * (len(str(self.base_dir)) + 12) + "\n\n"
+
+    def _relative_path(self, file_path: pathlib.Path) -> str:
+        """Get a walked file's path relative to the repository root."""
+        # Walked files all start with the base directory, so slicing replaces relative_to()
+        return str(file_path)[len(self._base_prefix):]
+
+    def _file_header(self, file_path: pathlib.Path) -> bytes:
+        """Build the encoded header written before each file's content."""
+        rel_path = self._relative_path(file_path)
+        return b"\nFile: " + rel_path.encode('utf-8') + b"\n" + b"-" * (len(rel_path) + 6) + b"\n\n"
+
+    def _read_file(self, file_path: pathlib.Path) -> Tuple[Optional[bytes], int, Optional[Tuple[int, int, int]]]:
+        """
+        Read and analyze a file for _iter_output(), in a worker thread.
+        
+        Returns:
+            Tuple[Optional[bytes], int, Optional[Tuple[int, int, int]]]: The content
+            (None if the file is too large to hold and must be copied), its size,
+            and its line counts (None if it is left to the process pool).
+        """
+        with open(file_path, 'rb') as infile:
+            if os.fstat(infile.fileno()).st_size > self.STREAM_THRESHOLD:
+                # Too large to hold in memory: validate and count it in a streaming
+                # pass now, and copy it when its turn comes
+                file_size, line_counts = self._scan_file(file_path)
+                return None, file_size, line_counts
+            data = infile.read()
+        self._check_binary_head(file_path, data)
+        # For small files the round trip to a worker process costs more than the work
+        if len(data) >= self.PROCESS_THRESHOLD:
+            return data, len(data), None
+        return data, len(data), _analyze_content(data)
+
+    def _scan_file(self, file_path: pathlib.Path) -> Tuple[int, Tuple[int, int, int]]:
+        """
+        Validate a large file as UTF-8 and count its lines.
+        
+        The file is memory-mapped and decoded in COPY_CHUNK_SIZE slices of the
+        mapping, without copying it into intermediate bytes objects.
+        
+        Returns:
+            Tuple[int, Tuple[int, int, int]]: File size and (total, empty, comment) line counts.
+            
+        Raises:
+            BinaryFileError: If the file has a NUL byte in its first BINARY_SNIFF_SIZE bytes.
+            UnicodeDecodeError: If the file is not valid UTF-8.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        total_lines = empty_lines = comment_lines = 0
+        carry = ''
+        
+        with open(file_path, 'rb') as infile:
+            if not os.fstat(infile.fileno()).st_size:
+                # Empty files cannot be mapped
+                return 0, (0, 0, 0)
+            
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self._check_binary_head(file_path, mapped)
+                file_size = len(mapped)
                 
-                # Process each file
-                for file_path in files:
+                with memoryview(mapped) as view:
                     try:
-                        with open(file_path, 'r', encoding='utf-8') as infile:
-                            content = infile.read()
+                        for offset in range(0, file_size, self.COPY_CHUNK_SIZE):
+                            # Count lines up to the last '\n'; the rest may continue in the next slice
+                            text = carry + decoder.decode(view[offset:offset + self.COPY_CHUNK_SIZE])
+                            cut = text.rfind('\n') + 1
+                            carry = text[cut:]
                             
-                            # Write file header
-                            rel_path = file_path.relative_to(self.base_dir)
-                            outfile.write(f"\nFile: {rel_path}\n")
-                            outfile.write("-" * (len(str(rel_path)) + 6) + "\n\n")
-                            outfile.write(content)
-                            outfile.write("\n")
-                            
-                            # Update statistics
-                            self._update_file_stats(file_path, content)
-                            self.stats.file_stats.processed_files += 1
-                            
-                    except UnicodeDecodeError:
-                        logger.warning(f"Skipping binary file: {file_path}")
-                        self.stats.file_stats.skipped_files += 1
-                    except Exception as e:
-                        logger.error(f"Error processing file {file_path}: {e}")
-                        self.stats.file_stats.skipped_files += 1
-            
-            return output_filename
+                            total, empty, comment = self._count_lines(text[:cut].splitlines())
+                            total_lines += total
+                            empty_lines += empty
+                            comment_lines += comment
+                        
+                        total, empty, comment = self._count_lines((carry + decoder.decode(b'', final=True)).splitlines())
+                    except UnicodeDecodeError as e:
+                        # Drop the traceback: its frames hold slices of the mapping, which must not outlive it
+                        raise e.with_traceback(None)
+        
+        return file_size, (total_lines + total, empty_lines + empty, comment_lines + comment)
+
+    def _copy_file(self, file_path: pathlib.Path, file_size: int, out_fd: int) -> None:
+        """
+        Append the first file_size bytes of a file (as scanned by _scan_file()) to a file descriptor.
+        
+        The copy is done in the kernel with os.sendfile() where file-to-file
+        sendfile is supported, and otherwise written straight from a memory
+        mapping of the file.
+        """
+        with open(file_path, 'rb') as infile:
+            offset = 0
+            try:
+                while offset < file_size:
+                    sent = os.sendfile(out_fd, infile.fileno(), offset, file_size - offset)
+                    if not sent:
+                        break  # The file shrank after it was scanned
+                    offset += sent
+                return
+            except (AttributeError, OSError) as e:
+                # No sendfile (Windows), or not between regular files (macOS)
+                if offset or (isinstance(e, OSError) and e.errno not in _NO_SENDFILE_ERRNOS):
+                    raise
             
-        except Exception as e:
-            logger.error(f"Combining failed: {str(e)}")
-            raise FileConcatenatorError(f"Combining error: {str(e)}")
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                end = min(file_size, len(view))
+                while offset < end:
+                    offset += os.write(out_fd, view[offset:end])
 
-    def _is_comment_line(self, line: str) -> bool:
-        """Check if a line is a comment based on common comment markers."""
-        comment_markers = ['#', '//', '/*', '*', '<!--', '-->', '"""', "'''"]
-        stripped = line.strip()
-        return any(stripped.startswith(marker) for marker in comment_markers)
+    async def _iter_file_chunks(self, file_path: pathlib.Path, file_size: int) -> AsyncIterator[bytes]:
+        """Yield the first file_size bytes of a file (as scanned by _scan_file()) in chunks."""
+        async with aiofiles.open(file_path, 'rb') as infile:
+            while file_size > 0:
+                chunk = await infile.read(min(self.COPY_CHUNK_SIZE, file_size))
+                if not chunk:
+                    break
+                file_size -= len(chunk)
+                yield chunk
+
+    def _extension(self, file_path: pathlib.Path) -> str:
+        """Get the lowercased extension of a file, as recorded by the walk."""
+        extension = self._extensions.get(file_path)
+        if extension is None:
+            extension = file_path.suffix.lower()
+        return extension
+
+    def _check_binary_name(self, file_path: pathlib.Path):
+        """Raise BinaryFileError if the file has a known binary extension."""
+        extension = self._extension(file_path)
+        if extension in self.BINARY_EXTENSIONS:
+            raise BinaryFileError(f"Binary file extension: {extension}")
+
+    def _check_binary_head(self, file_path: pathlib.Path, data: bytes):
+        """Raise BinaryFileError if the start of the file contains a NUL byte."""
+        if b'\x00' in data[:self.BINARY_SNIFF_SIZE]:
+            raise BinaryFileError(f"NUL byte in {file_path.name}")
+
+    @classmethod
+    def _count_lines(cls, lines: List[str]) -> Tuple[int, int, int]:
+        """Count the total, empty and comment lines in a list of lines."""
+        # Map C-level str methods over the lines instead of looping in Python
+        return (
+            len(lines),
+            lines.count('') + sum(map(str.isspace, lines)),
+            sum(map(methodcaller('startswith', cls.COMMENT_MARKERS), map(str.lstrip, lines)))
+        )
 
-    def _update_file_stats(self, file_path: pathlib.Path, content: str):
-        """Update file statistics for a processed file."""
+    def _update_file_stats(self, file_path: pathlib.Path, file_size: int, line_counts: Tuple[int, int, int]):
+        """Update file statistics for a processed file of file_size bytes."""
+        file_stats = self.stats.file_stats
+        
         # Update file type stats
-        file_type = file_path.suffix.lower() or 'no extension'
-        if file_type.startswith('.'):
-            file_type = file_type[1:]  # Remove the leading dot
-        self.stats.file_stats.file_types[file_type] = \
-            self.stats.file_stats.file_types.get(file_type, 0) + 1
-
-        # Update size stats
-        file_size = file_path.stat().st_size
-        self.stats.file_stats.total_size += file_size
-        if file_size > self.stats.file_stats.largest_file["size"]:
-            self.stats.file_stats.largest_file = {
-                'path': str(file_path.relative_to(self.base_dir)),
+        file_type = self._extension(file_path)[1:] or 'no extension'  # Without the leading dot
+        file_stats.file_types[file_type] = file_stats.file_types.get(file_type, 0) + 1
+
+        # Update size stats (from the bytes already read, no extra stat)
+        file_stats.total_size += file_size
+        if file_size > file_stats.largest_file["size"]:
+            file_stats.largest_file = {
+                'path': self._relative_path(file_path),
                 'size': file_size
             }
 
         # Update line stats
-        lines = content.splitlines()
-        self.stats.file_stats.total_lines += len(lines)
-        self.stats.file_stats.empty_lines += sum(1 for line in lines if not line.strip())
-        self.stats.file_stats.comment_lines += sum(1 for line in lines if self._is_comment_line(line))
-
-    def _update_dir_stats(self, current_path: pathlib.Path, files_count: int):
-        """Update directory statistics."""
-        self.stats.dir_stats.total_dirs += 1
+        total_lines, empty_lines, comment_lines = line_counts
+        file_stats.total_lines += total_lines
+        file_stats.empty_lines += empty_lines
+        file_stats.comment_lines += comment_lines
+
+    def _update_dir_stats(self, rel_path: str, files_count: int):
+        """Update directory statistics for a directory relative to the root ('' for the root)."""
+        dir_stats = self.stats.dir_stats
+        dir_stats.total_dirs += 1
         
         # Update depth stats
-        relative_path = current_path.relative_to(self.base_dir)
-        depth = len(relative_path.parts)
-        self.stats.dir_stats.max_depth = max(self.stats.dir_stats.max_depth, depth)
+        depth = rel_path.count(os.sep) + 1 if rel_path else 0
+        dir_stats.max_depth = max(dir_stats.max_depth, depth)
         
         # Update directory with most files
-        if files_count > self.stats.dir_stats.dirs_with_most_files["count"]:
-            self.stats.dir_stats.dirs_with_most_files = {
-                'path': str(relative_path),
+        if files_count > dir_stats.dirs_with_most_files["count"]:
+            dir_stats.dirs_with_most_files = {
+                'path': rel_path or '.',
                 'count': files_count
             }
         
         # Update empty directory count
         if files_count == 0:
-            self.stats.dir_stats.empty_dirs += 1
+            dir_stats.empty_dirs += 1
 
-    def _update_filter_stats(self, file_path: pathlib.Path, is_gitignore: bool):
-        """Update filter statistics when a file is ignored."""
-        rel_path = str(file_path.relative_to(self.base_dir))
+    def _is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Check if a path relative to the repository root should be ignored
+        based on combined patterns.
         
-        if is_gitignore:
-            self.stats.filter_stats.gitignore_filtered += 1
-            # Check which gitignore pattern matched
-            for pattern in self.additional_ignores:
-                if PathSpec.from_lines(GitWildMatchPattern, [pattern]).match_file(rel_path):
-                    self.stats.filter_stats.pattern_matches[pattern] = \
-                        self.stats.filter_stats.pattern_matches.get(pattern, 0) + 1
-        else:
-            self.stats.filter_stats.custom_filtered += 1
-            # Check which custom pattern matched
-            for pattern in self.additional_ignores:
-                if PathSpec.from_lines(GitWildMatchPattern, [pattern]).match_file(rel_path):
-                    self.stats.filter_stats.pattern_matches[pattern] = \
-                        self.stats.filter_stats.pattern_matches.get(pattern, 0) + 1
-
-    def _is_ignored(self, path: pathlib.Path) -> bool:
-        """Check if path should be ignored based on combined patterns."""
+        Directories are matched with a trailing slash so directory-only
+        patterns such as "node_modules/" prune the whole subtree.
+        """
         try:
-            rel_path = str(path.relative_to(self.base_dir))
-            is_ignored = self.pattern_manager.should_ignore(rel_path)
-            logger.debug(f"Checking if {rel_path} should be ignored: {is_ignored}")
+            if is_dir:
+                rel_path += "/"
+            is_ignored = self._ignore_cache.get(rel_path)
+            if is_ignored is None:
+                is_ignored = self.pattern_manager.should_ignore(rel_path)
+                self._ignore_cache[rel_path] = is_ignored
+                logger.debug(f"Checking if {rel_path} should be ignored: {is_ignored}")
             return is_ignored
         except Exception as e:
-            logger.error(f"Error checking ignore status for {path}: {e}")
+            logger.error(f"Error checking ignore status for {rel_path}: {e}")
             return True
 
-    def _build_directory_tree(self) -> TreeNode:
-        """Build a directory tree structure."""
-        root = TreeNode(
-            name=self.base_dir.name or self.base_dir.absolute(),
-            path=str(self.base_dir),
-            type='directory',
-            children=[]
-        )
-
-        def add_to_tree(current_path: pathlib.Path, node: TreeNode):
-            """Recursively add files and directories to the tree."""
-            try:
-                # Sort entries for consistent display
-                entries = sorted(current_path.iterdir(), key=lambda x: (x.is_file(), x.name.lower()))
-                
-                for entry in entries:
-                    if self._is_ignored(entry):
-                        continue
-                        
-                    is_file = entry.is_file()
-                    child = TreeNode(
-                        name=entry.name,
-                        path=str(entry.relative_to(self.base_dir)),
-                        type='file' if is_file else 'directory',
-                        children=[],
-                        metadata={
-                            'size': entry.stat().st_size if is_file else None,
-                            'extension': entry.suffix.lower() if is_file else None
-                        }
-                    )
-                    
-                    if not is_file:
-                        add_to_tree(entry, child)
-                    
-                    node.children.append(child)
-            except Exception as e:
-                logger.error(f"Error building tree for {current_path}: {e}")
-
-        add_to_tree(self.base_dir, root)
-        return root
-
     def _get_repo_name(self) -> str:
         """Extract repository name from the base directory."""
         try:
@@ -270,15 +562,15 @@ class FileConcatenator:
                     # If we're in a subdirectory, append it to make the name more specific
                     subdir_path = self.base_dir.relative_to(self.base_dir.parent)
                     if str(subdir_path) != repo_name:
-                        clean_subdir = re.sub(r'[^\w\-]', '_', str(subdir_path))
+                        clean_subdir = _SAFE_NAME_RE.sub('_', str(subdir_path))
                         return f"{repo_name}_{clean_subdir}"
                     return repo_name
             
             # Fallback: use the last directory name
-            return re.sub(r'[^\w\-]', '_', self.base_dir.name)
+            return _SAFE_NAME_RE.sub('_', self.base_dir.name)
         except Exception as e:
             logger.warning(f"Error extracting repo name: {e}, using fallback")
-            return re.sub(r'[^\w\-]', '_', self.base_dir.name)
+            return _SAFE_NAME_RE.sub('_', self.base_dir.name)
 
     def _generate_unique_filename(self, repo_name: str) -> str:
         """Generate a unique filename for output."""
@@ -287,29 +579,91 @@ class FileConcatenator:
         pid = os.getpid()  # Process ID
         
         # Clean up repo_name to ensure it's filesystem-safe
-        clean_name = re.sub(r'[^\w\-]', '_', repo_name)
+        clean_name = _SAFE_NAME_RE.sub('_', repo_name)
         return f"output_{clean_name}_{timestamp}_pid{pid}_{unique_id}.txt"
 
-    def _walk_directory(self) -> List[pathlib.Path]:
-        """Walk the directory and return a list of files to process."""
+    def _walk_and_build(self) -> Tuple[List[pathlib.Path], TreeNode]:
+        """
+        Walk the repository once, collecting the files to process and building
+        the directory tree (and directory statistics) in the same pass.
+        
+        Returns:
+            Tuple[List[pathlib.Path], TreeNode]: Sorted files to process and the tree root.
+        """
         files = []
+        root = TreeNode(
+            name=self.base_dir.name or self.base_dir.absolute(),
+            path=str(self.base_dir),
+            type='directory',
+            children=[]
+        )
+
+        # Locals are cheaper than attribute lookups in the loop below
+        base_dir = self.base_dir
+        is_ignored = self._is_ignored
+        update_dir_stats = self._update_dir_stats
+        extensions = self._extensions
+        sizes = self._sizes
+
+        def open_dir(current_path: pathlib.Path, rel_path: str):
+            """List the entries of a directory and record its statistics."""
+            try:
+                # Sort entries for consistent display; DirEntry caches its type and stat
+                with os.scandir(current_path) as it:
+                    entries = sorted(it, key=lambda e: (e.is_file(), e.name.lower()))
+            except OSError as e:
+                logger.error(f"Error building tree for {current_path}: {e}")
+                return iter(())
+            
+            # Update directory stats (all non-directory entries, as os.walk counts them)
+            update_dir_stats(rel_path, sum(1 for e in entries if not e.is_dir()))
+            return iter(entries)
+
         try:
-            for root, dirs, filenames in os.walk(self.base_dir):
-                root_path = pathlib.Path(root)
-                
-                # Update directory stats
-                self._update_dir_stats(root_path, len(filenames))
-                
-                # Filter out ignored directories
-                dirs[:] = [d for d in dirs if not self._is_ignored(root_path / d)]
-                
-                # Add non-ignored files
-                for filename in filenames:
-                    file_path = root_path / filename
-                    if not self._is_ignored(file_path):
-                        files.append(file_path)
+            # Depth-first walk with an explicit stack of (directory, relative path prefix, node,
+            # remaining entries), visiting directories in the same order as a recursive walk would
+            stack = deque([(base_dir, '', root, open_dir(base_dir, ''))])
+            while stack:
+                current_path, rel_prefix, node, entries = stack[-1]
+                for entry in entries:
+                    entry_path = current_path / entry.name
+                    # Relative paths are built once per entry and shared by the checks, stats and tree
+                    rel_path = rel_prefix + entry.name
+                    is_dir = entry.is_dir()
+                    # Ignored directories are skipped without listing their contents
+                    if is_ignored(rel_path, is_dir):
+                        continue
+                    
+                    is_file = entry.is_file()
+                    extension = size = None
+                    if not is_dir:
+                        # Computed once per file, for the tree and the file stats
+                        extension = extensions[entry_path] = entry_path.suffix.lower()
+                    if is_file:
+                        # Sizes bound the read-ahead
+                        size = sizes[entry_path] = entry.stat().st_size
+                    child = TreeNode(
+                        name=entry.name,
+                        path=rel_path,
+                        type='file' if is_file else 'directory',
+                        children=[],
+                        metadata={
+                            'size': size,
+                            'extension': extension if is_file else None
+                        }
+                    )
+                    node.children.append(child)
+                    
+                    if not is_dir:
+                        files.append(entry_path)
+                    elif not entry.is_symlink():
+                        # Descend now; this directory's remaining entries resume afterwards
+                        stack.append((entry_path, rel_path + os.sep, child, open_dir(entry_path, rel_path)))
+                        break
+                else:
+                    stack.pop()
             
-            return sorted(files)
+            return sorted(files), root
         except Exception as e:
             logger.error(f"Error walking directory: {e}")
             raise FileConcatenatorError(f"Error accessing directory: {str(e)}")
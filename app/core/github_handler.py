@@ -9,19 +9,19 @@ and cloning repositories with cache support.
 import git
 import tempfile
 import os
-from typing import Optional, Dict, Any
+import errno
+from typing import Optional, Dict, Any, NamedTuple
 from pathlib import Path
 import logging
 import re
 import uuid
+import time
 from datetime import datetime
 import hashlib
 import shutil
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import urlparse
-from pathspec import PathSpec
-from pathspec.patterns import GitWildMatchPattern
+from functools import lru_cache
 
 from app.models.schemas import (
     GitHubConfig,
@@ -40,10 +40,66 @@ from app.config.pattern_manager import PatternManager
 
 logger = logging.getLogger(__name__)
 
+def _find_ram_tmp() -> Optional[str]:
+    """
+    Get the RAM-backed directory for pre-check clones, if enabled.
+    
+    Opt-in with PRECHECK_RAM_TMP, since clones there use the host's shared
+    memory: "1" probes /dev/shm and $XDG_RUNTIME_DIR, any other value is
+    taken as the directory to use.
+    """
+    setting = os.getenv("PRECHECK_RAM_TMP", "").strip()
+    if setting.lower() in ("", "0", "false", "no", "off"):
+        return None
+    candidates = ("/dev/shm", os.environ.get("XDG_RUNTIME_DIR")) if setting.lower() in ("1", "true", "yes", "on") else (setting,)
+    return next((path for path in candidates if path and os.path.isdir(path) and os.access(path, os.W_OK)), None)
+
+# RAM-backed directory for short-lived pre-check clones, and how many of them
+# may be there at once (the rest clone to disk)
+_RAM_TMP = _find_ram_tmp()
+_RAM_TMP_SLOTS = int(os.getenv("PRECHECK_RAM_TMP_SLOTS", "2"))
+
+# GitHub repository URLs: owner, repository, and an optional subdirectory,
+# either directly after the repository or after tree/<ref>/
+_GITHUB_URL_RE = re.compile(
+    r"[A-Za-z][A-Za-z0-9+.-]*://github\.com/+"
+    r"(?P<owner>[^/?#]+)/(?P<repo>[^/?#]+)"
+    r"(?:/+(?:tree/+[^/?#]+(?:/+(?P<tree_subdir>[^?#]*[^/?#]))?|(?P<subdir>[^?#]*[^/?#])))?"
+    r"/*(?:[?#].*)?",
+    re.DOTALL
+)
+_GITHUB_HOST_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*://github\.com(?:[/?#]|$)")
+
+def _is_out_of_space(error: Exception) -> bool:
+    """Check whether a failed clone ran out of space on the target filesystem."""
+    if isinstance(error, OSError):
+        return error.errno == errno.ENOSPC
+    return "no space left on device" in str(error).lower()
+
+@lru_cache(maxsize=1024)
+def _compute_repo_hash(base_url: str, token: str) -> str:
+    """Hash a repository URL and token into a 16 hex character cache key."""
+    return hashlib.blake2b(f"{base_url}:{token}".encode(), digest_size=8).hexdigest()
+
+class _CacheEntry(NamedTuple):
+    """A cached clone in the cache index; times are epoch seconds, so a cache hit only compares floats."""
+    info: CacheInfo
+    touched_at: float
+    expires_at: float
+
 class GitHubHandler:
     """Handles GitHub repository operations including cloning and temporary directories with caching."""
     
-    def __init__(self, cache_dir: Optional[str] = None, github_token: Optional[str] = None, cache_ttl: int = 3600):
+    # Minimum time between refreshing a cached clone's mtime on cache hits (seconds)
+    CACHE_TOUCH_SECONDS = 60
+    
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        github_token: Optional[str] = None,
+        cache_ttl: int = 3600,
+        max_concurrent_clones: int = 4
+    ):
         """
         Initialize the GitHubHandler with optional caching and authentication settings.
         
@@ -51,6 +107,8 @@ class GitHubHandler:
             cache_dir (Optional[str]): Directory for caching cloned repositories.
             github_token (Optional[str]): GitHub token for accessing private repositories.
             cache_ttl (int): Time-to-live for cache in seconds.
+            max_concurrent_clones (int): Git clones (for clone_repository() and
+                pre_check_repository()) run at once; further clones wait for a slot.
         """
         self.config = GitHubConfig(
             cache_dir=cache_dir,
@@ -58,7 +116,9 @@ class GitHubHandler:
             cache_ttl=cache_ttl
         )
         self._temp_dir = None
-        self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max(self.config.max_workers, max_concurrent_clones))
+        # Bounds concurrent git clones; requests sharing an in-flight clone don't take a slot
+        self._clone_slots = asyncio.Semaphore(max_concurrent_clones)
         
         # Setup cache directory
         if self.config.cache_dir:
@@ -75,6 +135,15 @@ class GitHubHandler:
             test_file.unlink()
         except Exception as e:
             raise FileSystemError(f"Cannot create or access cache directory: {e}", str(self._cache_dir))
+        
+        # Cached clones by repository hash, so cache hits are decided in memory
+        self._cache_ttl_seconds = self.config.cache_ttl_delta.total_seconds()
+        self._cache_index: Dict[str, _CacheEntry] = self._index_cache_dir()
+        
+        # Clones and pre-checks in progress, so concurrent requests share them
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        # Pre-check clones currently in _RAM_TMP
+        self._ram_prechecks = 0
 
     def validate_github_url(self, url: str) -> GitHubRepoInfo:
         """
@@ -89,120 +158,201 @@ class GitHubHandler:
         Raises:
             InvalidRepositoryError: If the URL is not a valid GitHub repository URL.
         """
-        try:
-            # Clean up the URL first
-            url = url.strip()
-            # Remove any parentheses and @ symbols
-            url = url.replace('(', '').replace(')', '').replace('@', '')
-            
-            parsed = urlparse(url)
-            if parsed.netloc != "github.com":
+        # Clean up the URL first, removing any parentheses and @ symbols
+        url = url.strip().replace('(', '').replace(')', '').replace('@', '')
+        
+        match = _GITHUB_URL_RE.fullmatch(url)
+        owner, repo = match.group("owner", "repo") if match else (None, None)
+        if repo and repo.endswith(".git"):
+            repo = repo[:-4]
+        if not repo:
+            if not _GITHUB_HOST_RE.match(url):
                 raise InvalidRepositoryError(url, "Not a GitHub URL")
-            
-            # Remove .git extension and split path
-            path = parsed.path.rstrip(".git").strip("/")
-            parts = path.split("/")
-            
-            if len(parts) < 2:
-                raise InvalidRepositoryError(
-                    url, 
-                    "Invalid repository path. URL should be in format: https://github.com/owner/repository[/path/to/directory]"
-                )
-                
-            owner, repo = parts[0], parts[1]
-            if not owner or not repo:
-                raise InvalidRepositoryError(
-                    url, 
-                    "Missing owner or repository name. URL should be in format: https://github.com/owner/repository[/path/to/directory]"
-                )
-
-            # Extract subdirectory path if it exists
-            subdir = None
-            if len(parts) > 2:
-                if parts[2] == "tree" and len(parts) > 3:
-                    # Handle GitHub web UI URLs (/tree/branch/path/to/dir)
-                    subdir = "/".join(parts[4:]) if len(parts) > 4 else None
-                else:
-                    # Handle direct paths (/path/to/dir)
-                    subdir = "/".join(parts[2:])
-                
-            base_url = f"https://github.com/{owner}/{repo}"
-            clone_url = f"{base_url}.git"
-            
-            return GitHubRepoInfo(
-                owner=owner,
-                repo_name=repo,
-                subdir=subdir,
-                base_url=base_url,
-                clone_url=clone_url
-            )
-            
-        except Exception as e:
-            if isinstance(e, InvalidRepositoryError):
-                raise
             raise InvalidRepositoryError(
                 url, 
-                f"Invalid GitHub URL format. Please use format: https://github.com/owner/repository[/path/to/directory]. Error: {str(e)}"
+                "Invalid repository path. URL should be in format: https://github.com/owner/repository[/path/to/directory]"
             )
+        
+        # GitHub web UI URLs (/tree/branch/path/to/dir) or direct paths (/path/to/dir)
+        subdir = match["tree_subdir"] or match["subdir"]
+        if subdir:
+            subdir = re.sub(r"/{2,}", "/", subdir)
+        
+        base_url = f"https://github.com/{owner}/{repo}"
+        clone_url = f"{base_url}.git"
+        
+        return GitHubRepoInfo(
+            owner=owner,
+            repo_name=repo,
+            subdir=subdir,
+            base_url=base_url,
+            clone_url=clone_url
+        )
     
-    def _get_repo_hash(self, repo_info: GitHubRepoInfo) -> str:
+    def _get_repo_hash(self, repo_info: GitHubRepoInfo, github_token: Optional[str] = None) -> str:
         """Generate a unique hash for the repository."""
         # Include token in hash if provided to handle private repos differently
-        hash_input = f"{repo_info.base_url}:{self.config.github_token if self.config.github_token else ''}"
-        return hashlib.sha256(hash_input.encode()).hexdigest()[:16]
+        token = github_token or self.config.github_token
+        return _compute_repo_hash(repo_info.base_url, token or '')
+    
+    def _cache_entry(self, cache_path: Path, touched_at: float) -> _CacheEntry:
+        """Build the cache index entry for a clone last used (or made) at an epoch time."""
+        expires_at = touched_at + self._cache_ttl_seconds
+        return _CacheEntry(
+            info=CacheInfo(
+                cache_path=cache_path,
+                is_valid=True,
+                created_at=datetime.fromtimestamp(touched_at),
+                expires_at=datetime.fromtimestamp(expires_at)
+            ),
+            touched_at=touched_at,
+            expires_at=expires_at
+        )
+
+    def _load_cache_entry(self, cache_path: Path) -> Optional[_CacheEntry]:
+        """Build the cache index entry of a cached clone from its directory mtime, or None if there is none."""
+        try:
+            return self._cache_entry(cache_path, cache_path.stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def _index_cache_dir(self) -> Dict[str, _CacheEntry]:
+        """Index the cached clones already on disk by repository hash."""
+        index = {}
+        try:
+            with os.scandir(self._cache_dir) as it:
+                for entry in it:
+                    if ".trash." in entry.name:
+                        # Left behind by a removal that was interrupted by a restart
+                        self._executor.submit(shutil.rmtree, entry.path, ignore_errors=True)
+                    elif entry.is_dir():
+                        index[entry.name] = self._cache_entry(Path(entry.path), entry.stat().st_mtime)
+        except OSError as e:
+            logger.warning(f"Could not index cache directory {self._cache_dir}: {e}")
+        return index
+    
+    def _remove_tree(self, path: Path) -> None:
+        """
+        Delete a directory tree without waiting for it.
+        
+        The directory is renamed first, so its path is free immediately; the
+        per-file deletion then runs on the executor.
+        """
+        trash_path = path.with_name(f"{path.name}.trash.{uuid.uuid4().hex}")
+        os.rename(path, trash_path)
+        self._executor.submit(shutil.rmtree, trash_path, ignore_errors=True)
     
-    def _get_cached_repo(self, repo_info: GitHubRepoInfo) -> Optional[CacheInfo]:
+    def _get_cached_repo(self, repo_info: GitHubRepoInfo, github_token: Optional[str] = None) -> Optional[CacheInfo]:
         """
         Check if a valid cached version of the repository exists.
         
+        Freshness is decided from the in-memory cache index; the disk is only
+        read for repositories this process has not seen yet.
+        
         Raises:
             CacheError: If there's an error accessing the cache
         """
         try:
-            repo_hash = self._get_repo_hash(repo_info)
+            repo_hash = self._get_repo_hash(repo_info, github_token)
             cache_path = self._cache_dir / repo_hash
             
-            if cache_path.exists():
-                try:
-                    # Check if cache is still valid
-                    mtime = datetime.fromtimestamp(cache_path.stat().st_mtime)
-                    now = datetime.now()
-                    expires_at = mtime + self.config.cache_ttl_delta
-                    
-                    if now < expires_at:
-                        # Verify cache integrity
-                        if not (cache_path / ".git").exists():
-                            raise CacheError("Cache corrupted: .git directory missing")
-                        # Update access time to prevent cleanup
-                        os.utime(cache_path, None)
-                        return CacheInfo(
-                            cache_path=cache_path,
-                            is_valid=True,
-                            created_at=mtime,
-                            expires_at=expires_at
-                        )
-                except Exception as e:
-                    if isinstance(e, CacheError):
-                        raise
-                    raise CacheError(f"Error validating cache: {e}")
-            return None
+            try:
+                entry = self._cache_index.get(repo_hash)
+                if entry is None:
+                    # Another worker sharing the cache directory may have cloned it
+                    entry = self._load_cache_entry(cache_path)
+                    if entry is None:
+                        return None
+                    self._cache_index[repo_hash] = entry
+                
+                # Check if cache is still valid (wall clock, as it is compared with mtimes)
+                now = time.time()
+                if now >= entry.expires_at:
+                    return None
+                
+                # Verify cache integrity (other workers may have removed it)
+                if not (cache_path / ".git").exists():
+                    self._cache_index.pop(repo_hash, None)
+                    raise CacheError("Cache corrupted: .git directory missing")
+                
+                # Update access time to prevent cleanup; the on-disk mtime is
+                # shared with other workers, so it is refreshed only periodically
+                if now - entry.touched_at >= self.CACHE_TOUCH_SECONDS:
+                    os.utime(cache_path, (now, now))
+                    entry = self._cache_index[repo_hash] = self._cache_entry(cache_path, now)
+                return entry.info
+            except Exception as e:
+                if isinstance(e, CacheError):
+                    raise
+                raise CacheError(f"Error validating cache: {e}")
         except Exception as e:
             if isinstance(e, CacheError):
                 raise
             raise CacheError(f"Error accessing cache: {e}")
 
-    async def pre_check_repository(self, repo_url: str, github_token: Optional[str] = None) -> GitHubRepoInfo:
+    async def pre_check_repository(
+        self,
+        repo_url: str,
+        github_token: Optional[str] = None,
+        repo_info: Optional[GitHubRepoInfo] = None
+    ) -> GitHubRepoInfo:
         """
         Quick check if a repository exists and is accessible.
         Does a lightweight clone to get accurate file information.
+        
+        Concurrent checks of the same repository share a single clone and result.
+        
+        Args:
+            repo_url (str): The repository URL to check.
+            github_token (Optional[str]): GitHub token for private repositories.
+            repo_info (Optional[GitHubRepoInfo]): Result of validate_github_url(repo_url)
+                if the caller already has it; the URL is parsed again otherwise.
+        """
+        key = ("precheck", repo_url, github_token or self.config.github_token)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_inflight(key, self._pre_check(repo_url, github_token, repo_info))
+        return await asyncio.shield(task)
+    
+    def _start_inflight(self, key: Any, coro) -> asyncio.Task:
         """
+        Run a clone coroutine as a task that concurrent requests for the same key can await.
+        
+        The task waits for a clone slot before the coroutine starts.
+        """
+        task = asyncio.ensure_future(self._in_clone_slot(coro))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+    
+    async def _in_clone_slot(self, coro):
+        """Await a clone coroutine once one of the clone slots is free."""
+        try:
+            async with self._clone_slots:
+                return await coro
+        finally:
+            # Never started if cancelled while waiting for a slot
+            coro.close()
+    
+    async def _pre_check(
+        self,
+        repo_url: str,
+        github_token: Optional[str],
+        repo_info: Optional[GitHubRepoInfo]
+    ) -> GitHubRepoInfo:
+        """Clone and scan a repository for pre_check_repository()."""
         try:
             # Parse repository URL and get info
-            repo_info = self.validate_github_url(repo_url)
+            if repo_info is None:
+                repo_info = self.validate_github_url(repo_url)
             logger.info(f"Validating repository URL: {repo_url}")
             
-            # Create a temporary directory for the clone
-            temp_dir = Path(tempfile.mkdtemp(prefix="repo_precheck_"))
+            # Create a temporary directory for the clone (in RAM if enabled and a slot is free;
+            # it only lives for the check)
+            in_ram = _RAM_TMP is not None and self._ram_prechecks < _RAM_TMP_SLOTS
+            temp_dir = Path(tempfile.mkdtemp(prefix="repo_precheck_", dir=_RAM_TMP if in_ram else None))
+            if in_ram:
+                self._ram_prechecks += 1
             
             try:
                 # Modify URL if token is provided
@@ -213,58 +363,45 @@ class GitHubHandler:
 
                 # Use ThreadPoolExecutor for blocking git operations
                 def check_repo():
+                    nonlocal temp_dir
                     try:
-                        # Do a shallow clone (depth=1) to minimize download
+                        # A bare shallow clone of the default branch: the tree listing below gives
+                        # every file's size without checking files out or walking the disk
                         logger.info(f"Performing shallow clone to check repository")
-                        git.Repo.clone_from(clone_url, temp_dir, depth=1, branch="main")  # Explicitly checkout main branch
-                        repo = git.Repo(temp_dir)
+                        try:
+                            repo = git.Repo.clone_from(
+                                clone_url, temp_dir, bare=True, depth=1, single_branch=True, no_tags=True
+                            )
+                        except (OSError, git.exc.GitCommandError) as e:
+                            if not in_ram or not _is_out_of_space(e):
+                                raise
+                            # The RAM-backed directory is too small for this repository; retry on disk
+                            logger.warning(f"No space left in {_RAM_TMP} for pre-check clone, retrying on disk")
+                            shutil.rmtree(temp_dir, ignore_errors=True)
+                            temp_dir = Path(tempfile.mkdtemp(prefix="repo_precheck_"))
+                            repo = git.Repo.clone_from(
+                                clone_url, temp_dir, bare=True, depth=1, single_branch=True, no_tags=True
+                            )
 
                         # Load repository's .gitignore patterns if they exist
-                        repo_ignores = []
-                        gitignore_path = temp_dir / ".gitignore"
-                        if gitignore_path.exists():
-                            with open(gitignore_path, "r") as f:
-                                repo_ignores = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+                        try:
+                            repo_ignores = repo.git.show("HEAD:.gitignore").splitlines()
+                        except git.exc.GitCommandError:
+                            repo_ignores = []
                         
                         # Use PatternManager for combined ignore patterns
                         pattern_manager = PatternManager(repo_ignores=repo_ignores)
-                        logger.info("Using combined ignore patterns:")
-                        for pattern in pattern_manager.all_ignores:
-                            logger.info(f"- {pattern}")
+                        logger.debug(f"Using combined ignore patterns: {pattern_manager.all_ignores}")
 
                         # Calculate actual file information
-                        total_size = 0
-                        file_count = 0
+                        file_sizes = self._list_tree_sizes(repo, repo_info.subdir)
+                        if repo_info.subdir and not file_sizes:
+                            logger.warning(f"Subdirectory not found in repository: {repo_info.subdir}")
+                            raise FileSystemError(f"Specified directory not found: {repo_info.subdir}")
 
-                        # Walk through the repository
-                        target_dir = temp_dir
-                        if repo_info.subdir:
-                            target_dir = temp_dir / repo_info.subdir
-                            if not target_dir.exists():
-                                logger.warning(f"Subdirectory not found at expected path: {target_dir}")
-                                raise FileSystemError(f"Specified directory not found: {repo_info.subdir}")
-
-                        for root, _, files in os.walk(target_dir):
-                            # Skip ignored directories
-                            rel_root = str(Path(root).relative_to(temp_dir))
-                            if pattern_manager.should_ignore(rel_root):
-                                continue
-                            
-                            for file in files:
-                                file_path = Path(root) / file
-                                rel_path = str(file_path.relative_to(temp_dir))
-                                
-                                # Skip ignored files
-                                if pattern_manager.should_ignore(rel_path):
-                                    continue
-                                
-                                try:
-                                    # Get actual file size
-                                    size = file_path.stat().st_size
-                                    total_size += size
-                                    file_count += 1
-                                except Exception as e:
-                                    logger.warning(f"Error getting file info for {file_path}: {e}")
+                        ignored = set(pattern_manager.match_files(file_sizes))
+                        total_size = sum(size for path, size in file_sizes.items() if path not in ignored)
+                        file_count = len(file_sizes) - len(ignored)
 
                         # Convert total size to KB
                         size_kb = total_size / 1024
@@ -294,9 +431,11 @@ class GitHubHandler:
                 return repo_info
 
             finally:
+                if in_ram:
+                    self._ram_prechecks -= 1
                 # Clean up temporary directory
                 try:
-                    shutil.rmtree(temp_dir)
+                    self._remove_tree(temp_dir)
                 except Exception as e:
                     logger.error(f"Error cleaning up temporary directory: {e}")
 
@@ -306,13 +445,85 @@ class GitHubHandler:
                 raise
             raise GitHubError(f"Unexpected error while checking repository: {str(e)}")
 
-    async def clone_repository(self, repo_url: str, github_token: Optional[str] = None) -> CloneResult:
+    def _list_tree_sizes(self, repo: git.Repo, subdir: Optional[str] = None) -> Dict[str, int]:
+        """
+        List the files at HEAD with their sizes, without reading the working tree.
+        
+        Args:
+            repo (git.Repo): Repository (bare or not) to list.
+            subdir (Optional[str]): Only list files below this directory.
+            
+        Returns:
+            Dict[str, int]: File size in bytes by path relative to the repository root.
+        """
+        args = ["-r", "-l", "-z", "HEAD"]
+        if subdir:
+            args += ["--", subdir]
+        
+        sizes = {}
+        # Each record is "<mode> <type> <object> <size>\t<path>"; submodules have no size
+        for record in repo.git.ls_tree(*args).split("\0"):
+            if not record:
+                continue
+            info, path = record.split("\t", 1)
+            _, object_type, _, size = info.split()
+            if object_type == "blob":
+                sizes[path] = int(size)
+        return sizes
+
+    def is_cached(self, repo_url: str, github_token: Optional[str] = None) -> bool:
+        """Check whether a valid cached clone of a repository exists, without cloning it."""
+        try:
+            repo_info = self.validate_github_url(repo_url)
+            return self._get_cached_repo(repo_info, github_token or self.config.github_token) is not None
+        except (InvalidRepositoryError, CacheError):
+            return False
+
+    def _try_cache(self, repo_info: GitHubRepoInfo, github_token: Optional[str] = None) -> Optional[CloneResult]:
+        """
+        Get the clone result for a valid cached repository, or None if it must be cloned.
+        
+        Runs synchronously on the event loop: a cache hit needs no git work.
+        
+        Raises:
+            FileSystemError: If the specified subdirectory doesn't exist in the cached repository
+        """
+        try:
+            cache_info = self._get_cached_repo(repo_info, github_token)
+        except CacheError as e:
+            logger.warning(f"Cache error, falling back to fresh clone: {e}")
+            return None
+        if cache_info is None:
+            return None
+        
+        logger.info(f"Using cached repository: {repo_info.base_url}")
+        # Verify subdirectory exists if specified
+        if repo_info.subdir:
+            subdir_path = cache_info.cache_path / repo_info.subdir
+            if not subdir_path.exists():
+                raise FileSystemError(f"Specified directory not found: {repo_info.subdir}", str(subdir_path))
+        return CloneResult(
+            repo_path=cache_info.cache_path,
+            subdir=repo_info.subdir,
+            from_cache=True,
+            cache_info=cache_info
+        )
+    
+    async def clone_repository(
+        self,
+        repo_url: str,
+        github_token: Optional[str] = None,
+        shallow: bool = False,
+        blob_filter: Optional[str] = None
+    ) -> CloneResult:
         """
         Clone a GitHub repository to a temporary directory with caching.
         
         Args:
             repo_url (str): The URL of the GitHub repository to clone
             github_token (Optional[str]): GitHub personal access token for private repositories
+            shallow (bool): Clone only the latest commit of the default branch (no history or tags)
+            blob_filter (Optional[str]): Partial clone filter spec, e.g. "blob:none"
             
         Returns:
             CloneResult: Result of the clone operation
@@ -325,54 +536,88 @@ class GitHubHandler:
             CacheError: For cache-related errors
         """
         try:
-            # Override token if provided
-            if github_token:
-                self.config.github_token = github_token
+            # Request token takes precedence; the handler is shared, so don't store it
+            token = github_token or self.config.github_token
                 
             # Validate repository URL and get info
             repo_info = self.validate_github_url(repo_url)
             
             # Check cache first
-            try:
-                if cache_info := self._get_cached_repo(repo_info):
-                    logger.info(f"Using cached repository: {repo_info.base_url}")
-                    # Verify subdirectory exists if specified
-                    if repo_info.subdir:
-                        subdir_path = cache_info.cache_path / repo_info.subdir
-                        if not subdir_path.exists():
-                            raise FileSystemError(f"Specified directory not found: {repo_info.subdir}", str(subdir_path))
-                    return CloneResult(
-                        repo_path=cache_info.cache_path,
-                        subdir=repo_info.subdir,
-                        from_cache=True,
-                        cache_info=cache_info
-                    )
-            except CacheError as e:
-                logger.warning(f"Cache error, falling back to fresh clone: {e}")
+            if clone_result := self._try_cache(repo_info, token):
+                return clone_result
+            
+            # Another request may already be cloning this repository: wait for it, then use its clone
+            repo_hash = self._get_repo_hash(repo_info, token)
+            while (inflight := self._inflight.get(repo_hash)) is not None:
+                try:
+                    # A failed clone fails every request waiting for it
+                    await asyncio.shield(inflight)
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    # Only the shared clone was cancelled, not this request; retry below
+                if clone_result := self._try_cache(repo_info, token):
+                    return clone_result
+            
+            task = self._start_inflight(
+                repo_hash, self._clone_to_cache(repo_info, token, shallow, blob_filter)
+            )
+            return await asyncio.shield(task)
             
+        except Exception as e:
+            # Re-raise appropriate exception
+            if isinstance(e, (RepositoryNotFoundError, AuthenticationError, 
+                            GitHubError, FileSystemError, CacheError, InvalidRepositoryError)):
+                raise
+            raise GitHubError(f"Unexpected error while cloning repository: {str(e)}")
+    
+    async def _clone_to_cache(
+        self,
+        repo_info: GitHubRepoInfo,
+        token: Optional[str],
+        shallow: bool,
+        blob_filter: Optional[str]
+    ) -> CloneResult:
+        """Clone a repository into its cache directory for clone_repository()."""
+        try:
             # Generate cache path
-            repo_hash = self._get_repo_hash(repo_info)
+            repo_hash = self._get_repo_hash(repo_info, token)
             cache_path = self._cache_dir / repo_hash
             
             # Ensure cache directory is clean
+            self._cache_index.pop(repo_hash, None)
             if cache_path.exists():
                 try:
-                    shutil.rmtree(cache_path)
+                    self._remove_tree(cache_path)
                 except Exception as e:
                     raise FileSystemError(f"Cannot clean existing cache: {e}", str(cache_path))
             
             # Modify URL if token is provided
             clone_url = repo_info.clone_url
-            if self.config.github_token:
-                clone_url = clone_url.replace("https://", f"https://{self.config.github_token}@")
+            if token:
+                clone_url = clone_url.replace("https://", f"https://{token}@")
             
             # Clone the repository to cache directory
             logger.info(f"Cloning repository: {repo_info.base_url} to cache")
             
             # Use ThreadPoolExecutor for blocking git operations
+            clone_options = {}
+            if shallow:
+                clone_options.update(depth=1, single_branch=True, no_tags=True)
+            if blob_filter:
+                clone_options["filter"] = blob_filter
+            
             def clone_repo():
                 try:
-                    git.Repo.clone_from(clone_url, cache_path)
+                    try:
+                        git.Repo.clone_from(clone_url, cache_path, **clone_options)
+                    except git.exc.GitCommandError as e:
+                        # Dumb HTTP servers cannot serve shallow or partial clones
+                        if not clone_options or "dumb http" not in str(e).lower():
+                            raise
+                        logger.warning(f"Server does not support shallow clones, doing a full clone: {repo_info.base_url}")
+                        shutil.rmtree(cache_path, ignore_errors=True)
+                        git.Repo.clone_from(clone_url, cache_path)
                     # Verify subdirectory exists if specified
                     if repo_info.subdir:
                         subdir_path = cache_path / repo_info.subdir
@@ -394,13 +639,8 @@ class GitHubHandler:
             )
             
             # Create cache info for the newly cloned repository
-            now = datetime.now()
-            cache_info = CacheInfo(
-                cache_path=cloned_path,
-                is_valid=True,
-                created_at=now,
-                expires_at=now + self.config.cache_ttl_delta
-            )
+            entry = self._cache_index[repo_hash] = self._cache_entry(cloned_path, time.time())
+            cache_info = entry.info
             
             return CloneResult(
                 repo_path=cloned_path,
@@ -413,7 +653,7 @@ class GitHubHandler:
             # Clean up any partial cache
             try:
                 if 'cache_path' in locals() and cache_path.exists():
-                    shutil.rmtree(cache_path)
+                    self._remove_tree(cache_path)
             except Exception as cleanup_error:
                 logger.error(f"Error cleaning up after failed clone: {cleanup_error}")
             
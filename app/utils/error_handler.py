@@ -7,7 +7,7 @@ It includes exception classes and handlers that ensure proper logging of errors.
 import logging
 import traceback
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -59,7 +59,7 @@ async def app_exception_handler(request: Request, exc: AppException):
     Logs the exception and returns a JSON response with the error details.
     """
     logger.error(f"Application error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers=exc.headers
@@ -73,7 +73,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     Logs the exception and returns a JSON response with the error details.
     """
     logger.error(f"HTTP error {exc.status_code}: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers=exc.headers
@@ -88,7 +88,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     """
     error_detail = str(exc)
     logger.error(f"Validation error: {error_detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors()}
     )
@@ -104,7 +104,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {str(exc)}")
     logger.error(traceback.format_exc())
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "An unexpected error occurred. Please try again later."}
     )
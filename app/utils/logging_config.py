@@ -1,9 +1,55 @@
+import atexit
 import logging
+import queue
 import sys
 import os
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
 
+# Background listeners that drain queued loggers (see setup_logging)
+_queue_listeners = []
+
+def _stop_queue_listeners():
+    """Flush and stop all queue listeners that are running, reporting any dropped records."""
+    while _queue_listeners:
+        logger, queue_handler, listener = _queue_listeners.pop()
+        listener.stop()
+        if queue_handler.dropped:
+            # The listener is stopped, so write straight to its handlers
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0,
+                "Dropped %d log records because the log queue was full", (queue_handler.dropped,), None
+            )
+            for handler in listener.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+atexit.register(_stop_queue_listeners)
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _attach_queue(logger, log_queue, *handlers):
+    """Route a logger through a queue drained by a background listener thread."""
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    queue_handler = DroppingQueueHandler(log_queue)
+    _queue_listeners.append((logger, queue_handler, listener))
+    
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+
 class EmojiFormatter(logging.Formatter):
     """Custom formatter that adds emojis to log messages based on level."""
     
@@ -66,8 +112,13 @@ class ClientLogFormatter(logging.Formatter):
             client_ip = client_data.get('client_ip', 'unknown')
             session_id = client_data.get('session_id', 'unknown')
             
-            # Add client context to the message
+            # Add client context to the message without altering the shared record
+            original_msg = record.msg
             record.msg = f"[{client_ip}] [{session_id}] {record.msg}"
+            try:
+                return super().format(record)
+            finally:
+                record.msg = original_msg
         
         return super().format(record)
 
@@ -89,7 +140,7 @@ def setup_logging():
     # Configure formatters
     console_formatter = logging.Formatter('%(emoji)s %(message)s')
     file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(emoji)s %(message)s')
-    client_formatter = logging.Formatter('%(asctime)s - CLIENT - %(levelname)s - %(message)s - %(client_info)s')
+    client_formatter = ClientLogFormatter('%(asctime)s - CLIENT - %(levelname)s - %(message)s')
     payment_formatter = logging.Formatter('%(asctime)s - PAYMENT - %(levelname)s - %(message)s')
     
     # Configure console handler with emoji formatting
@@ -148,19 +199,31 @@ def setup_logging():
     root_logger.addHandler(error_file_handler)
     root_logger.addHandler(debug_file_handler)
     
+    # Client and payment logs are emitted from inside async request handlers,
+    # so they are queued and written to file/console by background threads.
+    _stop_queue_listeners()
+    
     # Configure client logger
     client_logger = logging.getLogger("client")
     client_logger.setLevel(logging.INFO)
     client_logger.propagate = False  # Don't propagate to root logger
-    client_logger.addHandler(client_file_handler)
-    client_logger.addHandler(console_handler)  # Also log to console
+    _attach_queue(
+        client_logger,
+        queue.Queue(maxsize=10_000),  # Bounded: client logs are best effort
+        client_file_handler,
+        console_handler  # Also log to console
+    )
     
     # Configure payment logger
     payment_logger = logging.getLogger("payment")
     payment_logger.setLevel(logging.DEBUG)
     payment_logger.propagate = False  # Don't propagate to root logger
-    payment_logger.addHandler(payment_file_handler)
-    payment_logger.addHandler(console_handler)  # Also log to console
+    _attach_queue(
+        payment_logger,
+        queue.Queue(),
+        payment_file_handler,
+        console_handler  # Also log to console
+    )
     
     # Configure API request logger
     api_logger = logging.getLogger("api.request")
@@ -0,0 +1,105 @@
+"""
+Outbound rate limiting.
+
+This module provides a token bucket used to pace calls to external HTTP
+APIs (such as Stripe) so that bursts of traffic are smoothed out before the
+remote service starts rejecting requests with HTTP 429.
+"""
+
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header into seconds to wait.
+
+    Args:
+        value (Optional[str]): Header value, either delay seconds or an HTTP-date.
+
+    Returns:
+        Optional[float]: Seconds to wait (0 for dates in the past), or None if
+        the header is missing or can't be parsed.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return None
+    return max(seconds, 0.0)
+
+class TokenBucket:
+    """
+    Async token bucket with an optional cap on concurrent calls.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``.
+    Each call takes one token and waits for a refill when none are left.
+    Use it as an async context manager around the outbound call.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, max_concurrency: Optional[int] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (Optional[float]): Maximum burst size; defaults to ``rate``.
+            max_concurrency (Optional[int]): Maximum calls in flight at once.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all calls for the given time (e.g. from a Retry-After header)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Wait until a call is allowed and take a token for it."""
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+
+                    wait = self._paused_until - now
+                    if wait <= 0:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            return
+                        wait = (1 - self._tokens) / self.rate
+                    await asyncio.sleep(wait)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        """Free the concurrency slot taken by acquire()."""
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def __aenter__(self) -> "TokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
@@ -0,0 +1,91 @@
+"""
+Checkout session state store.
+
+This module provides a small key/value store for checkout session state
+(e.g. sessions confirmed as paid by a webhook) and other short-lived
+request results. When a Redis URL is configured the state is shared by all
+application workers, with a local copy kept for at most local_ttl seconds;
+otherwise it is kept in process memory.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+import orjson
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """
+    Stores terminal checkout session state keyed by session ID.
+
+    Values are small JSON-serializable dicts. Entries are written through to
+    Redis (if configured) and to a bounded in-process TTL cache, which also
+    serves as a read-through cache. Terminal states never change, so by
+    default local copies live as long as the entry; stores whose values are
+    overwritten should pass a short local_ttl (or 0 to always read Redis) so
+    workers don't serve each other's stale values.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        maxsize: int = 10_000,
+        redis_url: Optional[str] = None,
+        local_ttl: Optional[int] = None
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            namespace (str): Key prefix used in Redis.
+            ttl (int): Time-to-live for entries in seconds.
+            maxsize (int): Maximum number of entries kept in process.
+            redis_url (Optional[str]): Redis connection URL; in-process only if not set.
+            local_ttl (Optional[int]): Seconds a Redis-backed entry is served from the
+                in-process cache (default: ttl; 0 disables it). Ignored without Redis.
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        if redis_url and local_ttl is not None:
+            ttl = local_ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl) if ttl > 0 else None
+        self._redis = aioredis.from_url(redis_url) if redis_url else None
+
+    def _key(self, session_id: str) -> str:
+        """Build the Redis key for a session."""
+        return f"{self.namespace}:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored state for a session, or None if unknown."""
+        value = self._local.get(session_id) if self._local is not None else None
+        if value is not None or self._redis is None:
+            return value
+
+        try:
+            raw = await self._redis.get(self._key(session_id))
+        except aioredis.RedisError as e:
+            logger.warning(f"Session store read failed for {session_id}: {e}")
+            return None
+        if raw is None:
+            return None
+
+        value = orjson.loads(raw)
+        if self._local is not None:
+            self._local[session_id] = value
+        return value
+
+    async def set(self, session_id: str, value: Dict[str, Any]) -> None:
+        """Store the state for a session."""
+        if self._local is not None:
+            self._local[session_id] = value
+        if self._redis is None:
+            return
+
+        try:
+            await self._redis.set(self._key(session_id), orjson.dumps(value), ex=self.ttl)
+        except aioredis.RedisError as e:
+            logger.warning(f"Session store write failed for {session_id}: {e}")